@@ -1,340 +1,663 @@
-from bs4 import BeautifulSoup
 import csv
 import time
-from urllib.parse import urljoin, urlparse
-from playwright.sync_api import sync_playwright, TimeoutError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+import asyncio
 import concurrent.futures
 from functools import partial
+from collections import Counter, defaultdict
+import threading
+import argparse
+from dataclasses import dataclass, asdict
+import requests
+from requests.adapters import HTTPAdapter
 import os
+from browser_service import BrowserService
+from product_store import ProductStore
+from html_parsers import parse_html, check_backend
+from run_journal import CategoryJournal
+from extraction_schema import listing_extractor, detail_extractor
+import instrumentation
+from host_scheduler import request, scheduler_stats, print_scheduler_stats
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.109 Safari/537.36'
+
+# Number of detail pages fetched at the same time for one category
+DETAIL_CONCURRENCY = int(os.environ.get('BANANINA_DETAIL_CONCURRENCY', 4))
+
+# Pages the shared browser keeps open at once, across all categories
+BROWSER_MAX_PAGES = int(os.environ.get('BANANINA_BROWSER_MAX_PAGES', 8))
+
+# Navigations a browser context serves before it is closed and replaced
+CONTEXT_MAX_NAVIGATIONS = int(os.environ.get('BANANINA_CONTEXT_MAX_NAVIGATIONS', 50))
+
+# Memory the shared Chromium may use across all categories before it is restarted (0 = no cap)
+BROWSER_MAX_MEMORY_MB = int(os.environ.get('BANANINA_BROWSER_MAX_MEMORY_MB', 1500))
+
+# A page still busy after this long is hung; its context is closed and the URL retried
+LISTING_HANG_SECONDS = 120
+DETAIL_HANG_SECONDS = 30
+
+# Chromium is restarted when the median of the recent navigations gets slower than this
+BROWSER_SLOW_SECONDS = float(os.environ.get('BANANINA_BROWSER_SLOW_SECONDS', 20))
+
+# JSON lines log of the browser watchdog's memory samples and actions
+BROWSER_LOG = os.environ.get('BANANINA_BROWSER_LOG', os.path.join('metrics', 'browser.jsonl'))
+
+# Listing records waiting for a detail worker; bounds memory while pages keep loading
+LISTING_QUEUE_SIZE = int(os.environ.get('BANANINA_LISTING_QUEUE_SIZE', 64))
+
+# Lean navigation: block heavy resources and wait adaptively instead of fixed sleeps
+LEAN_PAGES = os.environ.get('BANANINA_LEAN_PAGES', '1') != '0'
+
+# Request types aborted in lean mode; only the HTML and its scripts are needed
+BLOCKED_RESOURCE_TYPES = ['image', 'media', 'font']
+
+# Hosts whose subresources are still loaded in lean mode
+FIRST_PARTY_HOSTS = ['banananina.co.id']
+
+# How long a scroll may take to reveal more product boxes before we stop scrolling
+SCROLL_SETTLE_MS = 1500
+
+# Navigation timeout and detail div wait used for product pages in lean mode
+DETAIL_TIMEOUT_MS = 10000
+DETAIL_WAIT_MS = 2000
+
+# SQLite file holding the product state of previous runs
+STATE_DB = os.environ.get('BANANINA_STATE_DB', 'bananina_state.db')
+
+# Detail pages older than this are fetched again even if the listing is unchanged
+DETAIL_TTL_HOURS = float(os.environ.get('BANANINA_DETAIL_TTL_HOURS', 24 * 7))
+
+# Directory of the per-category journals used by --resume
+JOURNAL_DIR = os.environ.get('BANANINA_JOURNAL_DIR', 'journal')
+
+# Fetched rows journaled before the journal is flushed to disk
+JOURNAL_BATCH_SIZE = 20
+
+# Try a plain HTTP request before rendering a page in Chromium
+HTTP_FIRST = os.environ.get('BANANINA_HTTP_FIRST', '1') != '0'
+
+# Plain HTTP requests per second and at the same time against the shop (0 = no rate cap)
+HOST_RATE = float(os.environ.get('BANANINA_HOST_RATE', 10))
+HOST_MAX_CONCURRENCY = int(os.environ.get('BANANINA_HOST_MAX_CONCURRENCY', 8))
+
+# HTML parser used for listing and detail pages: html.parser, lxml or selectolax
+PARSER_BACKEND = os.environ.get('BANANINA_PARSER', 'html.parser')
+
+# Classes of the listing page divs we read; everything else is skipped while parsing
+LISTING_DIV_CLASSES = ['category-products', 'product-box', 'pages']
+
+# Ids of the detail page divs that get_product_details_async reads
+DETAIL_DIV_IDS = [
+    'product-quality',
+    'product-description',
+    'product-details',
+    'product-condition',
+    'product-completeness'
+]
+
+# Pages served per path during the current run (listing/detail x http/browser)
+fetch_stats = Counter()
+fetch_seconds = Counter()
+# Seconds each page took, per path, for latency percentiles
+fetch_latencies = defaultdict(list)
+_fetch_stats_lock = threading.Lock()
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+_browser_service = None
+_browser_service_lock = threading.Lock()
+
+CSV_HEADER = [
+    "Brand",
+    "Name", 
+    "Price", 
+    "Original Price", 
+    "Discount", 
+    "Product Link", 
+    "Primary Image",
+    "Hover Image",
+    "SKU",
+    "Quality",
+    "Description",
+    "Details",
+    "Condition"
+]
+
+@dataclass(slots=True)
+class ListingRecord:
+    """Listing fields of one product, kept instead of its product-box tag"""
+    brand: str
+    name: str
+    price: str
+    original_price: str
+    discount: str
+    product_link: str
+    primary_image: str
+    hover_image: str
+    sku: str
 
 def get_headers():
     return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.109 Safari/537.36',
+        'User-Agent': USER_AGENT,
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
     }
 
-def scrape_with_playwright(base_url):
-    """Attempt to scrape using Playwright"""
-    browser = None
-    try:
-        print("Trying with Playwright...")
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--disable-gpu', '--no-sandbox', '--disable-dev-shm-usage']
+def count_fetch(kind, elapsed):
+    """Record that one page was served by the given path in elapsed seconds"""
+    with _fetch_stats_lock:
+        fetch_stats[kind] += 1
+        fetch_seconds[kind] += elapsed
+        fetch_latencies[kind].append(elapsed)
+    instrumentation.observe(kind, elapsed)
+
+def print_fetch_stats():
+    """Print how many pages each fetch path served during this run and their average time"""
+    print("Pages served per path:")
+    for kind in ['listing_http', 'listing_browser', 'detail_http', 'detail_browser']:
+        count = fetch_stats[kind]
+        average = fetch_seconds[kind] / count if count else 0
+        print(f"- {kind}: {count} pages, {average:.2f}s per page")
+
+def get_http_session():
+    """Return the shared keep-alive HTTP session, creating it on first use"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.headers.update(get_headers())
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+def get_browser_service():
+    """Return the browser service shared by every category, creating it on first use"""
+    global _browser_service
+    with _browser_service_lock:
+        if _browser_service is None:
+            _browser_service = BrowserService(
+                user_agent=USER_AGENT,
+                launch_args=['--disable-gpu', '--no-sandbox', '--disable-dev-shm-usage'],
+                viewport={'width': 1920, 'height': 1080},
+                max_pages=BROWSER_MAX_PAGES,
+                max_navigations=CONTEXT_MAX_NAVIGATIONS,
+                blocked_resource_types=BLOCKED_RESOURCE_TYPES if LEAN_PAGES else None,
+                first_party_hosts=FIRST_PARTY_HOSTS if LEAN_PAGES else None,
+                max_memory_mb=BROWSER_MAX_MEMORY_MB,
+                slow_navigation_seconds=BROWSER_SLOW_SECONDS,
+                log_path=BROWSER_LOG
             )
-            
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.109 Safari/537.36',
-                viewport={'width': 1920, 'height': 1080}
+        return _browser_service
+
+def close_browser_service():
+    """Shut down the shared browser, printing how much it was used"""
+    global _browser_service
+    with _browser_service_lock:
+        if _browser_service is None:
+            return
+        stats = _browser_service.stats
+        print(f"Browser: {stats['launches']} launches, {stats['contexts']} contexts, "
+              f"{stats['recycled']} recycled, {stats['navigations']} navigations, "
+              f"{stats['blocked']} requests blocked")
+        if stats['launches']:
+            print(f"Browser watchdog: peak memory {stats['peak_memory_mb']:.0f} MB, {stats['hung']} hung pages, "
+                  f"{stats['restarts']} restarts, {stats['retried']} retried (log in {BROWSER_LOG})")
+        _browser_service.close()
+        _browser_service = None
+
+def fetch_html(url, kind='page'):
+    """Fetch a page over plain HTTP, returning None when it can't be used.
+
+    Requests go through the shop's rate and concurrency limiter and are
+    retried on timeouts, 429 and 5xx; kind labels them in the retry stats.
+    """
+    try:
+        with instrumentation.timer('http.fetch'):
+            response, _ = request(
+                url, lambda: get_http_session().get(url, timeout=15),
+                rate=HOST_RATE, max_concurrency=HOST_MAX_CONCURRENCY, label=kind
             )
-            
-            page = context.new_page()
-            page.set_default_timeout(60000)
-            page.set_default_navigation_timeout(60000)
-            
-            all_products = []
-            current_page = 1
-            
-            while True:
-                # Construct URL with page number
-                url = f"{base_url}?p={current_page}"
-                print(f"\nScraping page {current_page}...")
-                
-                # Navigate to the page
-                page.goto(url)
-                page.wait_for_load_state('domcontentloaded')
-                
-                try:
-                    # Wait for products to be visible
-                    page.wait_for_selector('.category-products', state='visible', timeout=60000)
-                    
-                    # Scroll down the page
-                    for _ in range(3):
-                        page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
-                        page.wait_for_timeout(2000)
-                    
-                    # Get page content
-                    content = page.content()
-                    soup = BeautifulSoup(content, 'html.parser')
-                    
-                    # Find products on current page
-                    products = soup.find_all('div', class_='product-box')
-                    
-                    if not products:
-                        print(f"No products found on page {current_page}")
-                        break
-                    
-                    print(f"Found {len(products)} products on page {current_page}")
-                    all_products.extend(products)
-                    
-                    # Check if there's a next page
-                    pagination = soup.find('div', class_='pages')
-                    if not pagination:
-                        print("No pagination found")
-                        break
-                        
-                    next_link = pagination.find('a', class_='next')
-                    if not next_link:
-                        print("No next page link found")
-                        break
-                    
-                    # Check if we're on the last page by looking at the active page number
-                    current_span = pagination.find('span', class_='current')
-                    if current_span:
-                        total_pages = max([
-                            int(a.get_text()) 
-                            for a in pagination.find_all(['a', 'span']) 
-                            if a.get_text().strip().isdigit()
-                        ])
-                        if current_page >= total_pages:
-                            print(f"Reached last page ({total_pages})")
-                            break
-                    
-                    current_page += 1
-                    
-                except Exception as e:
-                    print(f"Error processing page {current_page}: {str(e)}")
-                    break
-            
-            print(f"\nTotal products found across all pages: {len(all_products)}")
-            return all_products if all_products else None
-                
+        if response.status_code != 200:
+            return None
+        return response.text
     except Exception as e:
-        print(f"Playwright setup error: {str(e)}")
+        print(f"HTTP fetch failed for {url}: {str(e)}")
         return None
-    finally:
-        if browser:
+
+def parse_listing_html(content):
+    """Parse only the product grid and pagination of a listing page"""
+    with instrumentation.timer('listing.parse'):
+        return parse_html(content, PARSER_BACKEND, div_classes=LISTING_DIV_CLASSES)
+
+def parse_detail_html(content):
+    """Parse only the detail divs of a product page"""
+    with instrumentation.timer('detail.parse'):
+        return parse_html(content, PARSER_BACKEND, div_ids=DETAIL_DIV_IDS)
+
+def parse_listing_page(soup, current_page):
+    """Return the product boxes on a listing page and whether another page follows"""
+    # Find products on current page
+    products = soup.find_all('div', class_='product-box')
+    
+    if not products:
+        print(f"No products found on page {current_page}")
+        return products, False
+    
+    print(f"Found {len(products)} products on page {current_page}")
+    
+    # Check if there's a next page
+    pagination = soup.find('div', class_='pages')
+    if not pagination:
+        print("No pagination found")
+        return products, False
+        
+    next_link = pagination.find('a', class_='next')
+    if not next_link:
+        print("No next page link found")
+        return products, False
+    
+    # Check if we're on the last page by looking at the active page number
+    current_span = pagination.find('span', class_='current')
+    if current_span:
+        total_pages = max([
+            int(a.get_text()) 
+            for a in pagination.find_all(['a', 'span']) 
+            if a.get_text().strip().isdigit()
+        ])
+        if current_page >= total_pages:
+            print(f"Reached last page ({total_pages})")
+            return products, False
+    
+    return products, True
+
+def listing_records(soup, current_page):
+    """Turn a parsed listing page into listing records and free its parse tree"""
+    products, has_next = parse_listing_page(soup, current_page)
+    
+    records = []
+    with instrumentation.timer('listing.extract'):
+        for index, product in enumerate(products, 1):
             try:
-                browser.close()
-            except:
-                pass  # Ignore any errors during browser closing
+                records.append(extract_listing_fields(product))
+            except Exception as e:
+                print(f"\nError processing product {index} on page {current_page}: {str(e)}")
+                continue
+    
+    soup.decompose()
+    return records, has_next
+
+async def render_listing_page(url):
+    """Render a listing page on a borrowed browser page and return its HTML"""
+    return await get_browser_service().browse(partial(render_listing_on, url=url), LISTING_HANG_SECONDS)
+
+async def render_listing_on(page, url):
+    """Render a listing page on page and return its HTML"""
+    page.set_default_timeout(60000)
+    page.set_default_navigation_timeout(60000)
+    
+    # Navigate to the page
+    with instrumentation.timer('listing.goto'):
+        await page.goto(url, wait_until='domcontentloaded' if LEAN_PAGES else 'load')
+        await page.wait_for_load_state('domcontentloaded')
+    
+    with instrumentation.timer('listing.wait'):
+        # Wait for products to be visible
+        await page.wait_for_selector('.category-products', state='visible', timeout=60000)
+        
+        # Scroll down the page
+        if LEAN_PAGES:
+            await scroll_until_stable(page)
+        else:
+            for _ in range(3):
+                await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+                await page.wait_for_timeout(2000)
+    
+    # Get page content
+    return await page.content()
+
+async def fetch_listing_page(base_url, current_page, http_first=HTTP_FIRST):
+    """Load one listing page, over plain HTTP unless its static HTML lacks the product grid"""
+    # Construct URL with page number
+    url = f"{base_url}?p={current_page}"
+    
+    if http_first:
+        started = time.perf_counter()
+        content = await asyncio.to_thread(instrumentation.call, fetch_html, url, 'listing')
+        soup = parse_listing_html(content) if content else None
+        if soup is not None and soup.select_one('.category-products'):
+            count_fetch('listing_http', time.perf_counter() - started)
+            return listing_records(soup, current_page)
+        print(f"Static HTML incomplete on page {current_page}, escalating to Playwright")
+    
+    started = time.perf_counter()
+    content = await render_listing_page(url)
+    soup = parse_listing_html(content)
+    elapsed = time.perf_counter() - started
+    count_fetch('listing_browser', elapsed)
+    print(f"Rendered page {current_page} in {elapsed:.2f}s")
+    return listing_records(soup, current_page)
 
-def get_product_details(page, url):
-    """Get additional product details from product page"""
+async def iter_listing_pages(base_url, start_page=1, http_first=HTTP_FIRST, journal=None):
+    """Yield the listing records of each page as soon as that page is loaded"""
+    current_page = start_page
+    
+    if journal:
+        # Pages journaled by an interrupted run are replayed instead of loaded again
+        for page_number, records, has_next in journal.pages:
+            print(f"\nReplaying page {page_number} from the journal...")
+            yield [ListingRecord(**record) for record in records]
+            if not has_next:
+                return
+            current_page = page_number + 1
+    
+    while True:
+        print(f"\nScraping page {current_page}...")
+        try:
+            records, has_next = await fetch_listing_page(base_url, current_page, http_first)
+        except Exception as e:
+            # A partial listing must not pass for the whole category: the journal and old CSV stay
+            print(f"Error processing page {current_page}: {str(e)}")
+            raise
+        
+        if journal:
+            journal.record_listing(current_page, [asdict(record) for record in records], has_next)
+        if records:
+            yield records
+        if not has_next:
+            break
+        
+        current_page += 1
+
+async def scroll_until_stable(page, max_scrolls=3):
+    """Scroll to the bottom until the number of product boxes stops growing"""
+    count = await page.locator('div.product-box').count()
+    for _ in range(max_scrolls):
+        await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+        try:
+            await page.wait_for_function(
+                'count => document.querySelectorAll("div.product-box").length > count',
+                arg=count,
+                timeout=SCROLL_SETTLE_MS
+            )
+        except PlaywrightTimeoutError:
+            # Nothing new was rendered, so the page is complete
+            break
+        count = await page.locator('div.product-box').count()
+
+def empty_product_details():
+    """Return the placeholder details used when a product page can't be read"""
+    return {
+        'quality': "N/A",
+        'description': "N/A",
+        'details': "N/A",
+        'condition': "N/A"
+    }
+
+def parse_product_details(content):
+    """Extract quality, description, details and condition from product page HTML"""
+    soup = parse_detail_html(content)
+    with instrumentation.timer('detail.extract'):
+        return extract_product_details(soup)
+
+def extract_product_details(soup):
+    """Extract quality, description, details and condition from a parsed product page"""
+    return detail_extractor.extract(soup)
+
+def get_static_product_details(url):
+    """Get product details over plain HTTP, returning None if the page needs a browser"""
+    content = fetch_html(url, 'detail')
+    if not content:
+        return None
+    
+    soup = parse_detail_html(content)
+    if not any(soup.find('div', id=div_id) for div_id in DETAIL_DIV_IDS):
+        return None
+    
+    with instrumentation.timer('detail.extract'):
+        return extract_product_details(soup)
+
+async def get_product_details_async(page, url):
+    """Get a product's details on a page lent by the browser service"""
     try:
-        page.set_default_timeout(15000)
-        page.goto(url)
+        if LEAN_PAGES:
+            # The detail divs are in the initial HTML, so don't wait for the load event
+            page.set_default_timeout(DETAIL_TIMEOUT_MS)
+            with instrumentation.timer('detail.goto'):
+                await page.goto(url, wait_until='domcontentloaded')
+            selector = ', '.join(f'#{div_id}' for div_id in DETAIL_DIV_IDS)
+            wait_ms = DETAIL_WAIT_MS
+        else:
+            page.set_default_timeout(15000)
+            with instrumentation.timer('detail.goto'):
+                await page.goto(url)
+            selector = '.product-description'
+            wait_ms = 5000
         
         try:
-            page.wait_for_selector('.product-description', timeout=5000)
+            with instrumentation.timer('detail.wait'):
+                await page.wait_for_selector(selector, state='attached', timeout=wait_ms)
         except:
             pass
             
-        content = page.content()
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        # Get product quality
-        quality = "N/A"
-        quality_elem = soup.find('div', id='product-quality')
-        if quality_elem:
-            quality = quality_elem.get_text(strip=True)
-            
-        # Get product description
-        description = "N/A"
-        desc_elem = soup.find('div', id='product-description')
-        if desc_elem:
-            description = desc_elem.get_text(strip=True)
-            
-        # Get product details and remove measurement note
-        details = "N/A"
-        details_elem = soup.find('div', id='product-details')
-        if details_elem:
-            details_list = []
-            for li in details_elem.find_all('li'):
-                text = li.get_text(strip=True)
-                # Remove the measurement note if present
-                if "Product size is measured based on BANANANINA" not in text:
-                    details_list.append(text)
-            details = ' | '.join(details_list)
-            
-        # Get product condition
-        condition = "N/A"
-        condition_elem = soup.find('div', id='product-condition')
-        if condition_elem:
-            condition = ' | '.join([li.get_text(strip=True) for li in condition_elem.find_all('li')])
-            
-        # Get completeness (if exists)
-        completeness = "N/A"
-        completeness_elem = soup.find('div', id='product-completeness')
-        if completeness_elem:
-            completeness = ' | '.join([li.get_text(strip=True) for li in completeness_elem.find_all('li')])
-            # Add completeness to condition if it exists
-            if completeness != "N/A":
-                condition = f"{condition} | Completeness: {completeness}"
-                
-        return {
-            'quality': quality,
-            'description': description,
-            'details': details,
-            'condition': condition
-        }
+        return parse_product_details(await page.content())
         
     except Exception as e:
-        print(f"Error getting product details from {url}: {str(e)}")
-        return {
-            'quality': "N/A",
-            'description': "N/A",
-            'details': "N/A",
-            'condition': "N/A"
-        }
-
-def process_products(products, category):
-    """Process and save product data"""
+        print(f"\nError getting product details from {url}: {str(e)}")
+        return empty_product_details()
+
+async def fetch_details(url):
+    """Get one product's details over HTTP, or on a borrowed browser page when needed"""
+    if url == "N/A":
+        return empty_product_details()
+    
+    product_details = None
+    started = time.perf_counter()
+    if HTTP_FIRST:
+        product_details = await asyncio.to_thread(instrumentation.call, get_static_product_details, url)
+    
+    if product_details is not None:
+        count_fetch('detail_http', time.perf_counter() - started)
+        return product_details
+    
+    # Borrow a page from the shared browser for this one product
+    started = time.perf_counter()
+    try:
+        product_details = await get_browser_service().browse(
+            partial(get_product_details_async, url=url), DETAIL_HANG_SECONDS
+        )
+    except Exception as e:
+        print(f"\nError getting product details from {url}: {str(e)}")
+        return empty_product_details()
+    count_fetch('detail_browser', time.perf_counter() - started)
+    return product_details
+
+def extract_listing_fields(product):
+    """Extract the listing record of a product-box tag"""
+    return ListingRecord(**listing_extractor.extract(product))
+
+def build_row(listing, product_details):
+    """Combine listing fields and product details into a CSV row"""
+    return [
+        listing.brand,
+        listing.name,
+        listing.price,
+        listing.original_price,
+        listing.discount,
+        listing.product_link,
+        listing.primary_image,
+        listing.hover_image,
+        listing.sku,
+        product_details['quality'],
+        product_details['description'],
+        product_details['details'],
+        product_details['condition']
+    ]
+
+def details_from_row(row):
+    """Recover the product details dict from a stored CSV row"""
+    return {
+        'quality': row[9],
+        'description': row[10],
+        'details': row[11],
+        'condition': row[12]
+    }
+
+def needs_details(listing, stored, now):
+    """Decide whether a product's detail page has to be fetched this run"""
+    if stored is None or stored['details_fetched_at'] is None:
+        return True
+    if (listing.price, listing.original_price, listing.discount) != (
+        stored['price'], stored['original_price'], stored['discount']
+    ):
+        return True
+    if details_from_row(stored['row']) == empty_product_details():
+        # The last attempt failed, so try again
+        return True
+    return now - stored['details_fetched_at'] > DETAIL_TTL_HOURS * 3600
+
+def product_key(listing, category):
+    """Return the key a product is stored under; the SKU when the listing has one"""
+    if listing.sku != "N/A":
+        return listing.sku
+    return f"{category}:{listing.brand}:{listing.name}"
+
+async def process_listing_stream(pages, category, concurrency=DETAIL_CONCURRENCY, journal=None, sink=None):
+    """Fetch details while listing pages are still arriving and stream rows to the CSV.
+
+    pages is an async iterator of listing record batches. Records go through a
+    bounded queue to concurrency detail workers; finished rows are written in
+    listing order as soon as every earlier row is done. Rows go to a temporary
+    file that replaces the CSV only once the category is complete. With a
+    journal, fetched rows are journaled and rows it already holds are reused.
+    With a sink, every written row is also awaited into sink.put_row(category,
+    position, row), which holds the worker back while later stages are busy.
+    Returns the number of rows written.
+    """
     filename = f"{category}_bags.csv"
+    temp_filename = f"{filename}.tmp"
+    queue = asyncio.Queue(maxsize=LISTING_QUEUE_SIZE)
+    workers = max(1, concurrency)
     
-    with open(filename, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "Brand",
-            "Name", 
-            "Price", 
-            "Original Price", 
-            "Discount", 
-            "Product Link", 
-            "Primary Image",
-            "Hover Image",
-            "SKU",
-            "Quality",
-            "Description",
-            "Details",
-            "Condition"
-        ])
-        
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.109 Safari/537.36'
-            )
-            page = context.new_page()
+    store = ProductStore(STATE_DB)
+    now = time.time()
+    stored = store.load_category(category)
+    
+    entries = []
+    finished = {}
+    file = None
+    writer = None
+    
+    def flush_rows():
+        # Write every finished row whose predecessors are already written; return them
+        nonlocal file, writer
+        flushed = len(entries)
+        with instrumentation.timer('csv.write'):
+            while len(entries) in finished:
+                entry = finished.pop(len(entries))
+                if writer is None:
+                    file = open(temp_filename, 'w', newline='', encoding='utf-8')
+                    writer = csv.writer(file)
+                    writer.writerow(CSV_HEADER)
+                writer.writerow(entry['row'])
+                entries.append(entry)
+                instrumentation.count('rows')
+            if file:
+                file.flush()
+        print(f"\rProcessed {len(entries)} {category} products...", end='', flush=True)
+        return entries[flushed:]
+    
+    async def produce():
+        seen = set()
+        try:
+            async for records in pages:
+                for record in records:
+                    key = product_key(record, category)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    await queue.put((len(seen) - 1, key, record))
+        finally:
+            for _ in range(workers):
+                await queue.put(None)
+    
+    async def work():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            position, key, record = item
             
-            for index, product in enumerate(products, 1):
-                try:
-                    # Extract brand name
-                    brand_elem = product.find('p', class_='brand')
-                    brand = brand_elem.get_text(strip=True) if brand_elem else "N/A"
-                    
-                    # Extract product name
-                    name_elem = product.find('p', class_='name')
-                    name = name_elem.get_text(strip=True) if name_elem else "N/A"
-                    
-                    # Extract prices and discount
-                    price_box = product.find('div', class_='price-box')
-                    price = "N/A"
-                    original_price = "N/A"
-                    discount = "No discount"
-                    
-                    if price_box:
-                        # Try to get special price first (discounted price)
-                        special_price = price_box.find('p', class_='special-price')
-                        if special_price:
-                            price_span = special_price.find('span', class_='price')
-                            if price_span:
-                                price = price_span.get_text(strip=True)
-                                
-                            # Get original price
-                            old_price = price_box.find('p', class_='old-price')
-                            if old_price:
-                                orig_span = old_price.find('span', class_='price')
-                                if orig_span:
-                                    original_price = orig_span.get_text(strip=True)
-                                    
-                            # Get discount percentage
-                            discount_elem = price_box.find('p', class_='yoursaving')
-                            if discount_elem:
-                                discount_span = discount_elem.find('span', class_='price')
-                                if discount_span:
-                                    discount = discount_span.get_text(strip=True)
-                        else:
-                            # If no special price, get regular price
-                            regular_price = price_box.find('span', class_='regular-price')
-                            if regular_price:
-                                price_span = regular_price.find('span', class_='price')
-                                if price_span:
-                                    price = price_span.get_text(strip=True)
-                    
-                    # Extract product link
-                    product_link = "N/A"
-                    link_elem = product.find('a', href=True)
-                    if link_elem:
-                        product_link = link_elem['href']
-                    
-                    # Extract image links
-                    primary_image = "N/A"
-                    hover_image = "N/A"
-                    images_div = product.find('div', class_='images')
-                    if images_div:
-                        # Get primary image
-                        primary_img = images_div.find('img', class_='img-primary')
-                        if primary_img:
-                            primary_image = primary_img.get('data-src') or primary_img.get('src', 'N/A')
-                            if 'blank.jpg' in primary_image:
-                                real_file = primary_img.get('realfile')
-                                if real_file:
-                                    primary_image = f"https://media.banananina.id/catalog/product/{real_file}"
-                        
-                        # Get hover/secondary image
-                        hover_img = images_div.find('img', class_='img-secondary')
-                        if hover_img:
-                            hover_image = hover_img.get('data-src') or hover_img.get('src', 'N/A')
-                            if 'blank.jpg' in hover_image:
-                                real_file = hover_img.get('realfile')
-                                if real_file:
-                                    hover_image = f"https://media.banananina.id/catalog/product/{real_file}"
-                    
-                    # Try to extract SKU from product link
-                    sku = "N/A"
-                    if product_link != "N/A":
-                        sku_match = product_link.split('/')[-1].split('.')[0]
-                        if sku_match:
-                            sku = sku_match
-                    
-                    # Get additional details if we have a valid product link
-                    product_details = {
-                        'quality': "N/A",
-                        'description': "N/A",
-                        'details': "N/A",
-                        'condition': "N/A"
-                    }
-                    
-                    if product_link != "N/A":
-                        print(f"\nGetting details for product {index}...")
-                        product_details = get_product_details(page, product_link)
-                    
-                    # Save the image URLs directly without downloading
-                    primary_image = primary_image if primary_image != "N/A" else "N/A"
-                    hover_image = hover_image if hover_image != "N/A" else "N/A"
-                    
-                    # Write row to CSV
-                    writer.writerow([
-                        brand,
-                        name,
-                        price,
-                        original_price,
-                        discount,
-                        product_link,
-                        primary_image,
-                        hover_image,
-                        sku,
-                        product_details['quality'],
-                        product_details['description'],
-                        product_details['details'],
-                        product_details['condition']
-                    ])
-                    
-                    print(f"\rProcessed {index}/{len(products)} products...", end='', flush=True)
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    print(f"\nError processing product {index}: {str(e)}")
-                    continue
+            # Only new, repriced or stale products need their detail page again
+            previous = stored.get(key)
+            journaled = journal.rows.get(key) if journal else None
+            if journaled:
+                product_details = details_from_row(journaled['row'])
+                details_fetched_at = journaled['details_fetched_at']
+            elif needs_details(record, previous, now):
+                product_details = await fetch_details(record.product_link)
+                details_fetched_at = now
+                if (previous and product_details == empty_product_details()
+                        and details_from_row(previous['row']) != empty_product_details()):
+                    # A failed refetch keeps the last good details, still due for a refetch
+                    product_details = details_from_row(previous['row'])
+                    details_fetched_at = previous['details_fetched_at']
+                if journal:
+                    journal.record_row(key, build_row(record, product_details), details_fetched_at)
+            else:
+                product_details = details_from_row(previous['row'])
+                details_fetched_at = previous['details_fetched_at']
             
-            browser.close()
+            finished[position] = {
+                'sku': key,
+                'position': position,
+                'price': record.price,
+                'original_price': record.original_price,
+                'discount': record.discount,
+                'row': build_row(record, product_details),
+                'details_fetched_at': details_fetched_at
+            }
+            for entry in flush_rows():
+                if sink:
+                    await sink.put_row(category, entry['position'], entry['row'])
+    
+    try:
+        tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(work()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave the producer blocked on a queue nobody reads any more
+            for task in tasks:
+                task.cancel()
+            raise
+        if file:
+            file.close()
+            file = None
+        if entries:
+            # Readers of the CSV never see a half-written file
+            os.replace(temp_filename, filename)
+            counts = store.save_category(category, entries, now)
+            print(f"\nData has been successfully scraped and saved to {filename}")
+            print(f"SKUs in {category}: {counts['new']} new, {counts['changed']} changed, "
+                  f"{counts['unchanged']} unchanged, {counts['gone']} gone")
+            if journal:
+                journal.close(finished=True)
+                journal = None
+    finally:
+        if file:
+            file.close()
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        if journal:
+            journal.close()
+        store.close()
     
-    print(f"\nData has been successfully scraped and saved to {filename}")
+    return len(entries)
 
 def get_category_urls():
     """Return a dictionary of category names and their URLs"""
@@ -349,49 +672,86 @@ def get_category_urls():
         'travel': 'https://www.banananina.co.id/bags/travel-bags.html'
     }
 
-def scrape_category(url, category):
-    """Scrape products from a specific category"""
+def scrape_category(url, category, concurrency=DETAIL_CONCURRENCY, resume=False, sink=None):
+    """Scrape products from a specific category, streaming its rows to sink if given"""
     print(f"\nStarting to scrape {category} bags from {url}")
     
-    products = scrape_with_playwright(url)
+    journal = CategoryJournal(
+        os.path.join(JOURNAL_DIR, f"{category}.jsonl"),
+        resume=resume,
+        batch_size=JOURNAL_BATCH_SIZE
+    )
+    if journal.pages:
+        print(f"Resuming {category}: {len(journal.pages)} listing pages and {len(journal.rows)} rows journaled")
     
-    if products:
-        print(f"Found {len(products)} {category} bags. Starting to extract data...")
-        process_products(products, category)
+    # Detail workers start on the first listing page instead of after the last one
+    written = get_browser_service().run(instrumentation.run_category(
+        process_listing_stream(iter_listing_pages(url, journal=journal), category, concurrency, journal, sink),
+        category
+    ))
+    if sink:
+        sink.category_done(category, written)
+    
+    if written:
+        print(f"Scraped {written} {category} bags")
         return True
     else:
         print(f"Failed to scrape {category} bags. Please check the website structure or try again later.")
         return False
 
-def scrape_main():
+def scrape_main(resume=False, concurrency=DETAIL_CONCURRENCY, sink=None):
     """Main function for scraping products"""
+    check_backend(PARSER_BACKEND)
     categories = get_category_urls()
     successful = 0
     failed = 0
+    fetch_stats.clear()
+    fetch_seconds.clear()
+    fetch_latencies.clear()
+    scheduler_stats.clear()
+    instrumentation.start('bananina')
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_to_category = {
-            executor.submit(scrape_category, url, category): category 
-            for category, url in categories.items()
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_category):
-            category = future_to_category[future]
-            try:
-                success = future.result()
-                if success:
-                    successful += 1
-                else:
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            future_to_category = {
+                executor.submit(scrape_category, url, category, concurrency, resume, sink): category 
+                for category, url in categories.items()
+            }
+            
+            for future in concurrent.futures.as_completed(future_to_category):
+                category = future_to_category[future]
+                try:
+                    success = future.result()
+                    if success:
+                        successful += 1
+                    else:
+                        failed += 1
+                except Exception as e:
+                    print(f"\nError processing {category}: {str(e)}")
                     failed += 1
-            except Exception as e:
-                print(f"\nError processing {category}: {str(e)}")
-                failed += 1
+    finally:
+        close_browser_service()
             
     print(f"\n{'='*50}")
     print(f"Scraping completed!")
     print(f"Successfully scraped: {successful} categories")
     print(f"Failed to scrape: {failed} categories")
+    print_fetch_stats()
+    print_scheduler_stats()
+    instrumentation.finish()
     print(f"{'='*50}")
 
 if __name__ == "__main__":
-    scrape_main()  # Only keep the scraping functionality
+    parser = argparse.ArgumentParser(description="Scrape bags from banananina.co.id into CSV files")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue interrupted categories from their journals")
+    parser.add_argument('--concurrency', type=int, default=DETAIL_CONCURRENCY,
+                        help="detail pages fetched at the same time per category")
+    parser.add_argument('--metrics', action='store_true',
+                        help="write per-stage timings to metrics/bananina.jsonl and metrics/bananina.prom")
+    parser.add_argument('--profile', metavar='CATEGORY',
+                        help="profile one category with cProfile into metrics/CATEGORY.pstats")
+    args = parser.parse_args()
+    instrumentation.configure(enabled=args.metrics or None, profile_category=args.profile)
+    
+    scrape_main(resume=args.resume, concurrency=args.concurrency)  # Only keep the scraping functionality
@@ -0,0 +1,204 @@
+"""Compare the compiled extraction schemas with the find() calls they replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.extraction [--listing-pages N] [--detail-pages N] [--repeat N]
+
+Pages are generated from data/*.csv and parsed once per backend; only the
+extraction from the parsed product boxes and detail pages is timed. Both
+extractors must return the same records for every backend.
+"""
+import argparse
+import time
+
+import bananina
+from bananina import ListingRecord
+from html_parsers import parse_html, available_backends
+from benchmarks import fixtures
+
+def find_product_details(soup):
+    """The detail extraction before schemas: one find() walk of the page per field"""
+    # Get product quality
+    quality = "N/A"
+    quality_elem = soup.find('div', id='product-quality')
+    if quality_elem:
+        quality = quality_elem.get_text(strip=True)
+        
+    # Get product description
+    description = "N/A"
+    desc_elem = soup.find('div', id='product-description')
+    if desc_elem:
+        description = desc_elem.get_text(strip=True)
+        
+    # Get product details and remove measurement note
+    details = "N/A"
+    details_elem = soup.find('div', id='product-details')
+    if details_elem:
+        details_list = []
+        for li in details_elem.find_all('li'):
+            text = li.get_text(strip=True)
+            # Remove the measurement note if present
+            if "Product size is measured based on BANANANINA" not in text:
+                details_list.append(text)
+        details = ' | '.join(details_list)
+        
+    # Get product condition
+    condition = "N/A"
+    condition_elem = soup.find('div', id='product-condition')
+    if condition_elem:
+        condition = ' | '.join([li.get_text(strip=True) for li in condition_elem.find_all('li')])
+        
+    # Get completeness (if exists)
+    completeness = "N/A"
+    completeness_elem = soup.find('div', id='product-completeness')
+    if completeness_elem:
+        completeness = ' | '.join([li.get_text(strip=True) for li in completeness_elem.find_all('li')])
+        # Add completeness to condition if it exists
+        if completeness != "N/A":
+            condition = f"{condition} | Completeness: {completeness}"
+            
+    return {
+        'quality': quality,
+        'description': description,
+        'details': details,
+        'condition': condition
+    }
+
+def find_listing_fields(product):
+    """The listing extraction before schemas: one find() walk of the product box per field"""
+    # Extract brand name
+    brand_elem = product.find('p', class_='brand')
+    brand = brand_elem.get_text(strip=True) if brand_elem else "N/A"
+    
+    # Extract product name
+    name_elem = product.find('p', class_='name')
+    name = name_elem.get_text(strip=True) if name_elem else "N/A"
+    
+    # Extract prices and discount
+    price_box = product.find('div', class_='price-box')
+    price = "N/A"
+    original_price = "N/A"
+    discount = "No discount"
+    
+    if price_box:
+        # Try to get special price first (discounted price)
+        special_price = price_box.find('p', class_='special-price')
+        if special_price:
+            price_span = special_price.find('span', class_='price')
+            if price_span:
+                price = price_span.get_text(strip=True)
+                
+            # Get original price
+            old_price = price_box.find('p', class_='old-price')
+            if old_price:
+                orig_span = old_price.find('span', class_='price')
+                if orig_span:
+                    original_price = orig_span.get_text(strip=True)
+                    
+            # Get discount percentage
+            discount_elem = price_box.find('p', class_='yoursaving')
+            if discount_elem:
+                discount_span = discount_elem.find('span', class_='price')
+                if discount_span:
+                    discount = discount_span.get_text(strip=True)
+        else:
+            # If no special price, get regular price
+            regular_price = price_box.find('span', class_='regular-price')
+            if regular_price:
+                price_span = regular_price.find('span', class_='price')
+                if price_span:
+                    price = price_span.get_text(strip=True)
+    
+    # Extract product link
+    product_link = "N/A"
+    link_elem = product.find('a', href=True)
+    if link_elem:
+        product_link = link_elem['href']
+    
+    # Extract image links
+    primary_image = "N/A"
+    hover_image = "N/A"
+    images_div = product.find('div', class_='images')
+    if images_div:
+        # Get primary image
+        primary_img = images_div.find('img', class_='img-primary')
+        if primary_img:
+            primary_image = primary_img.get('data-src') or primary_img.get('src', 'N/A')
+            if 'blank.jpg' in primary_image:
+                real_file = primary_img.get('realfile')
+                if real_file:
+                    primary_image = f"https://media.banananina.id/catalog/product/{real_file}"
+        
+        # Get hover/secondary image
+        hover_img = images_div.find('img', class_='img-secondary')
+        if hover_img:
+            hover_image = hover_img.get('data-src') or hover_img.get('src', 'N/A')
+            if 'blank.jpg' in hover_image:
+                real_file = hover_img.get('realfile')
+                if real_file:
+                    hover_image = f"https://media.banananina.id/catalog/product/{real_file}"
+    
+    # Try to extract SKU from product link
+    sku = "N/A"
+    if product_link != "N/A":
+        sku_match = product_link.split('/')[-1].split('.')[0]
+        if sku_match:
+            sku = sku_match
+    
+    return ListingRecord(
+        brand=brand,
+        name=name,
+        price=price,
+        original_price=original_price,
+        discount=discount,
+        product_link=product_link,
+        primary_image=primary_image,
+        hover_image=hover_image,
+        sku=sku
+    )
+
+def parse_products(pages, backend):
+    """Return the product boxes of every listing page parsed with backend"""
+    products = []
+    for content in pages:
+        soup = parse_html(content, backend, div_classes=bananina.LISTING_DIV_CLASSES)
+        products += soup.find_all('div', class_='product-box')
+    return products
+
+def time_extraction(extract, elements, repeat):
+    """Extract every element repeat times; return microseconds per element and the results"""
+    results = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(element) for element in elements]
+    elapsed = time.perf_counter() - started
+    return elapsed * 1e6 / (repeat * len(elements)), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--listing-pages', type=int, default=5, help='generated listing pages')
+    parser.add_argument('--detail-pages', type=int, default=100, help='generated detail pages')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = fixtures.load_catalog()['crossbody']
+    listing_pages = [fixtures.listing_page_html(rows, page)
+                     for page in range(1, min(args.listing_pages, fixtures.page_count(rows)) + 1)]
+    detail_pages = [fixtures.detail_page_html(row) for row in rows[:args.detail_pages]]
+
+    print(f"{len(listing_pages)} listing pages, {len(detail_pages)} detail pages, {args.repeat} rounds")
+    print(f"\n{'backend':<14}{'page':<9}{'find() us':>11}{'schema us':>11}{'speedup':>9}  same result")
+    for backend in available_backends():
+        products = parse_products(listing_pages, backend)
+        details = [parse_html(content, backend, div_ids=bananina.DETAIL_DIV_IDS) for content in detail_pages]
+        for kind, elements, before, after in [
+            ('listing', products, find_listing_fields, bananina.extract_listing_fields),
+            ('detail', details, find_product_details, bananina.extract_product_details)
+        ]:
+            before_us, before_results = time_extraction(before, elements, args.repeat)
+            after_us, after_results = time_extraction(after, elements, args.repeat)
+            same = 'yes' if before_results == after_results else 'NO'
+            print(f"{backend:<14}{kind:<9}{before_us:>11.1f}{after_us:>11.1f}{before_us / after_us:>8.1f}x  {same}")
+
+if __name__ == '__main__':
+    main()
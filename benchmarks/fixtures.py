@@ -0,0 +1,138 @@
+import csv
+import html
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+SITE_URL = 'https://www.banananina.co.id'
+MEDIA_PREFIX = 'https://media.banananina.id/catalog/product/'
+MEASUREMENT_NOTE = 'Product size is measured based on BANANANINA standard measurement'
+
+# Products per listing page on the live site
+PAGE_SIZE = 36
+
+def load_catalog(data_dir=DATA_DIR):
+    """Read every data/*_bags.csv into a dict of category -> rows"""
+    catalog = {}
+    for csv_file in sorted(Path(data_dir).glob('*_bags.csv')):
+        category = csv_file.name.replace('_bags.csv', '')
+        with open(csv_file, newline='', encoding='utf-8') as file:
+            catalog[category] = list(csv.DictReader(file))
+    return catalog
+
+def page_count(rows, page_size=PAGE_SIZE):
+    """Return how many listing pages a category with these rows has"""
+    return max(1, -(-len(rows) // page_size))
+
+def _chrome(body):
+    # Header, navigation, scripts and footer so pages weigh about what the real ones do
+    nav = ''.join(
+        f'<li class="level1"><a href="{SITE_URL}/menu/{i}.html"><span>Menu item {i}</span></a></li>'
+        for i in range(300)
+    )
+    scripts = ''.join(
+        f'<script type="text/javascript">var config{i} = {{"id": {i}, "enabled": true, "items": [1, 2, 3]}};</script>'
+        for i in range(60)
+    )
+    footer = ''.join(f'<div class="footer-col"><p>Footer block {i}</p></div>' for i in range(40))
+    return (
+        '<!DOCTYPE html><html><head><title>BANANANINA</title>' + scripts + '</head><body>'
+        f'<header><nav><ul class="nav">{nav}</ul></nav></header>'
+        f'<main>{body}</main><footer>{footer}</footer></body></html>'
+    )
+
+def _price_box(row):
+    price = html.escape(row['Price'])
+    original = row['Original Price']
+    if original and original != 'N/A':
+        return (
+            '<div class="price-box">'
+            f'<p class="old-price"><span class="price-label">Regular Price:</span><span class="price">{html.escape(original)}</span></p>'
+            f'<p class="special-price"><span class="price-label">Special Price</span><span class="price">{price}</span></p>'
+            f'<p class="yoursaving"><span class="price">{html.escape(row["Discount"])}</span></p>'
+            '</div>'
+        )
+    return f'<div class="price-box"><span class="regular-price"><span class="price">{price}</span></span></div>'
+
+def _image(css_class, url, media_url=None):
+    if media_url and url.startswith(MEDIA_PREFIX):
+        # Point images at a stand-in media host; the scraper reads data-src as is
+        url = media_url + url[len(MEDIA_PREFIX):]
+    url = html.escape(url)
+    if url.startswith(MEDIA_PREFIX):
+        # Lazy-loaded images carry the real file in an attribute, like the live site
+        real_file = url[len(MEDIA_PREFIX):]
+        return f'<img class="{css_class}" src="{SITE_URL}/skin/frontend/blank.jpg" realfile="{real_file}" alt="">'
+    return f'<img class="{css_class}" data-src="{url}" alt="">'
+
+def _link(row, site_url):
+    return row['Product Link'].replace(SITE_URL, site_url, 1)
+
+def listing_page_html(rows, page, page_size=PAGE_SIZE, site_url=SITE_URL, media_url=None):
+    """Render listing page `page` (1-based) for a category's rows.
+
+    site_url and media_url replace the live hosts in product and image
+    links, so a local server can stand in for both.
+    """
+    total_pages = page_count(rows, page_size)
+    boxes = []
+    for row in rows[(page - 1) * page_size:page * page_size]:
+        link = html.escape(_link(row, site_url))
+        boxes.append(
+            '<div class="item"><div class="product-box">'
+            f'<div class="images"><a href="{link}">{_image("img-primary", row["Primary Image"], media_url)}'
+            f'{_image("img-secondary", row["Hover Image"], media_url)}</a></div>'
+            f'<div class="product-info"><p class="brand">{html.escape(row["Brand"])}</p>'
+            f'<p class="name"><a href="{link}">{html.escape(row["Name"])}</a></p>'
+            f'{_price_box(row)}</div>'
+            '</div></div>'
+        )
+
+    numbers = []
+    for number in range(1, total_pages + 1):
+        if number == page:
+            numbers.append(f'<li><span class="current">{number}</span></li>')
+        else:
+            numbers.append(f'<li><a href="?p={number}">{number}</a></li>')
+    if page < total_pages:
+        numbers.append(f'<li><a class="next i-next" href="?p={page + 1}">Next</a></li>')
+    pages = f'<div class="pages"><strong>Page:</strong><ol>{"".join(numbers)}</ol></div>'
+
+    body = (
+        f'<div class="toolbar">{pages}</div>'
+        f'<div class="category-products"><div class="products-grid">{"".join(boxes)}</div></div>'
+        f'<div class="toolbar-bottom">{pages}</div>'
+    )
+    return _chrome(body)
+
+def _list_items(text):
+    if not text or text == 'N/A':
+        return ''
+    return '<ul>' + ''.join(f'<li>{html.escape(item)}</li>' for item in text.split(' | ')) + '</ul>'
+
+def detail_page_html(row):
+    """Render the product page a row's detail fields were scraped from"""
+    condition = row['Condition']
+    completeness = ''
+    if ' | Completeness: ' in condition:
+        condition, completeness = condition.split(' | Completeness: ', 1)
+
+    divs = []
+    if row['Quality'] and row['Quality'] != 'N/A':
+        divs.append(f'<div id="product-quality" class="quality">{html.escape(row["Quality"])}</div>')
+    if row['Description'] and row['Description'] != 'N/A':
+        divs.append(f'<div id="product-description" class="product-description"><p>{html.escape(row["Description"])}</p></div>')
+    if row['Details'] and row['Details'] != 'N/A':
+        details = _list_items(row['Details']).replace('</ul>', f'<li>{MEASUREMENT_NOTE}</li></ul>')
+        divs.append(f'<div id="product-details">{details}</div>')
+    if condition and condition != 'N/A':
+        divs.append(f'<div id="product-condition">{_list_items(condition)}</div>')
+    if completeness:
+        divs.append(f'<div id="product-completeness">{_list_items(completeness)}</div>')
+
+    body = (
+        f'<div class="product-view"><h1>{html.escape(row["Name"])}</h1>'
+        f'<div class="product-shop">{_price_box(row)}</div>'
+        f'<div class="product-collateral">{"".join(divs)}</div></div>'
+    )
+    return _chrome(body)
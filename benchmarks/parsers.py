@@ -0,0 +1,83 @@
+"""Compare HTML parser backends on listing and detail pages.
+
+Run from the repository root:
+
+    python -m benchmarks.parsers [--html-dir DIR] [--repeat N]
+
+DIR holds saved pages named listing*.html and detail*.html. Without it,
+pages are generated from data/*.csv. Every backend's extraction result is
+checked against a full html.parser parse, which is what the scraper used
+before parsing was scoped.
+"""
+import argparse
+import contextlib
+import io
+import time
+from pathlib import Path
+from bs4 import BeautifulSoup
+
+import bananina
+from html_parsers import parse_html, available_backends
+from benchmarks import fixtures
+
+def load_pages(html_dir, listing_pages, detail_pages):
+    """Return (listing, detail) lists of (page number, html)"""
+    if html_dir:
+        listing = [(1, path.read_text(encoding='utf-8')) for path in sorted(Path(html_dir).glob('listing*.html'))]
+        detail = [(1, path.read_text(encoding='utf-8')) for path in sorted(Path(html_dir).glob('detail*.html'))]
+        return listing, detail
+
+    rows = fixtures.load_catalog()['crossbody']
+    listing = [
+        (page, fixtures.listing_page_html(rows, page))
+        for page in range(1, min(listing_pages, fixtures.page_count(rows)) + 1)
+    ]
+    detail = [(1, fixtures.detail_page_html(row)) for row in rows[:detail_pages]]
+    return listing, detail
+
+def extract_listing(soup, page):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return bananina.listing_records(soup, page)
+
+def run(parse, extract, pages, repeat):
+    """Parse and extract every page repeat times; return seconds per page and the results"""
+    results = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(parse(content), page) for page, content in pages]
+    elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(pages)), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--html-dir', help='directory with saved listing*.html and detail*.html pages')
+    parser.add_argument('--listing-pages', type=int, default=5, help='generated listing pages')
+    parser.add_argument('--detail-pages', type=int, default=100, help='generated detail pages')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    listing, detail = load_pages(args.html_dir, args.listing_pages, args.detail_pages)
+    print(f"{len(listing)} listing pages, {len(detail)} detail pages, {args.repeat} rounds")
+
+    extract_detail = lambda soup, page: bananina.extract_product_details(soup)
+    variants = [('html.parser (full)', lambda content: BeautifulSoup(content, 'html.parser'),
+                 lambda content: BeautifulSoup(content, 'html.parser'))]
+    for backend in available_backends():
+        variants.append((
+            backend,
+            lambda content, backend=backend: parse_html(content, backend, div_classes=bananina.LISTING_DIV_CLASSES),
+            lambda content, backend=backend: parse_html(content, backend, div_ids=bananina.DETAIL_DIV_IDS)
+        ))
+
+    baseline = None
+    print(f"\n{'backend':<20}{'listing ms/page':>16}{'detail ms/page':>16}  matches baseline")
+    for name, parse_listing, parse_detail in variants:
+        listing_time, listing_results = run(parse_listing, extract_listing, listing, args.repeat)
+        detail_time, detail_results = run(parse_detail, extract_detail, detail, args.repeat)
+        if baseline is None:
+            baseline = (listing_results, detail_results)
+        matches = 'yes' if (listing_results, detail_results) == baseline else 'NO'
+        print(f"{name:<20}{listing_time * 1000:>16.2f}{detail_time * 1000:>16.2f}  {matches}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+"""Replay the scraper and image downloader against the local fixture server.
+
+Run from the repository root:
+
+    python -m benchmarks.replay [--categories totes,clutches] [--latency-ms 20]
+                                [--error-rate 0.02] [--pipeline] [--output replay_results.json]
+                                [--compare OLD.json]
+
+The fixture server (benchmarks.server) runs in a child process so its
+memory is not counted. Scraping and downloading happen in a temporary
+directory, starting from an empty state database and image store, so
+every product's detail page and images are fetched. Without --pipeline
+the scrape, the image downloads and a SQLite load run one after the
+other; with it they overlap as in pipeline.py. Results are written
+as JSON; --compare prints the change of each metric against an earlier
+results file, e.g. one produced on another commit.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import bananina
+import host_scheduler
+from benchmarks import fixtures
+from benchmarks.server import FixtureServer, CATEGORY_PATHS
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Metrics printed by --compare, with whether a higher value is better
+COMPARED_METRICS = [
+    ('scrape.pages_per_second', True),
+    ('scrape.products_per_second', True),
+    ('scrape.latency_p50_ms', False),
+    ('scrape.latency_p95_ms', False),
+    ('scrape.na_rows', False),
+    ('images.images_per_second', True),
+    ('images.megabytes_per_second', True),
+    ('total_seconds', False),
+    ('peak_rss_mb', False),
+]
+
+def serve(connection, options):
+    """Child process: start a fixture server and send its port to the parent"""
+    server = FixtureServer(('127.0.0.1', 0), **options)
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+def start_server(options):
+    """Start the fixture server process; return (process, base URL)"""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(child, options), daemon=True)
+    process.start()
+    port = parent.recv()
+    return process, f"http://127.0.0.1:{port}"
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Return the peak resident memory of this process, or of its finished children, so far"""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of values, or 0 for none"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def count_rows(csv_file):
+    """Return (rows, rows whose details are N/A) of a scraped CSV"""
+    if not os.path.exists(csv_file):
+        return 0, 0
+    with open(csv_file, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    return len(rows), sum(1 for row in rows if row['Description'] == 'N/A')
+
+def run_scrape(base_url, categories, concurrency):
+    """Scrape categories from the fixture server and return throughput and latency"""
+    bananina.fetch_stats.clear()
+    bananina.fetch_seconds.clear()
+    bananina.fetch_latencies.clear()
+    host_scheduler.scheduler_stats.clear()
+    rows = 0
+    na_rows = 0
+
+    started = time.perf_counter()
+    try:
+        for category in categories:
+            with contextlib.redirect_stdout(io.StringIO()):
+                bananina.scrape_category(base_url + CATEGORY_PATHS[category], category, concurrency)
+            category_rows, category_na = count_rows(f"{category}_bags.csv")
+            rows += category_rows
+            na_rows += category_na
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bananina.close_browser_service()
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for values in bananina.fetch_latencies.values() for seconds in values]
+    pages = sum(bananina.fetch_stats.values())
+    retries = host_scheduler.scheduler_stats
+    return {
+        'seconds': elapsed,
+        'pages': pages,
+        'pages_by_path': dict(bananina.fetch_stats),
+        'products': rows,
+        'na_rows': na_rows,
+        'retries': retries['retries'],
+        'detail_ok_after_retry': retries['detail_ok_after_retry'],
+        'detail_gave_up': retries['detail_gave_up'],
+        'pages_per_second': pages / elapsed,
+        'products_per_second': rows / elapsed,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_sharded_scrape(base_url, categories, workers, concurrency):
+    """Scrape categories through the task queue with worker processes"""
+    import sharded_scrape
+    from work_queue import WorkQueue
+
+    urls = {category: base_url + CATEGORY_PATHS[category] for category in categories}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run, counts, written, failed = sharded_scrape.run_sharded(urls, workers, concurrency, 'queue.db')
+    elapsed = time.perf_counter() - started
+
+    queue = WorkQueue('queue.db')
+    latencies = [result['seconds'] for _, _, state, _, result in queue.tasks(run) if state == 'done']
+    queue.close()
+    na_rows = sum(count_rows(f"{category}_bags.csv")[1] for category in categories)
+    pages = counts.get('done', 0)
+    rows = sum(written.values())
+    return {
+        'seconds': elapsed,
+        'workers': workers,
+        'pages': pages,
+        'failed_tasks': counts.get('failed', 0),
+        'failed_categories': len(failed),
+        'products': rows,
+        'na_rows': na_rows,
+        'pages_per_second': pages / elapsed,
+        'products_per_second': rows / elapsed,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'worker_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN)
+    }
+
+def run_images(categories):
+    """Download the images of the scraped CSVs and return throughput"""
+    # Imported here: download_images creates directories relative to the working directory
+    import download_images
+
+    csv_files = [f"{category}_bags.csv" for category in categories if os.path.exists(f"{category}_bags.csv")]
+    download_images.download_stats.clear()
+    host_scheduler.scheduler_stats.clear()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        download_images.download_all(csv_files)
+    elapsed = time.perf_counter() - started
+
+    stats = download_images.download_stats
+    return {
+        'seconds': elapsed,
+        'images': stats['images'],
+        'failed': stats['failed'],
+        'retries': host_scheduler.scheduler_stats['retries'],
+        'ok_after_retry': host_scheduler.scheduler_stats['image_ok_after_retry'],
+        'megabytes': stats['bytes'] / (1024 * 1024),
+        'images_per_second': stats['images'] / elapsed,
+        'megabytes_per_second': stats['bytes'] / (1024 * 1024) / elapsed,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_pipeline(base_url, categories, concurrency):
+    """Scrape categories while their images download and rows load into SQLite"""
+    # Imported here for the same reason as download_images in run_images
+    import download_images
+    import load_catalog
+    import pipeline
+
+    bananina.fetch_stats.clear()
+    host_scheduler.scheduler_stats.clear()
+    download_images.download_stats.clear()
+    flow = pipeline.Pipeline(lambda: load_catalog.connect_sqlite('catalog.db'))
+    started = time.perf_counter()
+    flow.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for category in categories:
+                bananina.scrape_category(base_url + CATEGORY_PATHS[category], category, concurrency, sink=flow)
+            bananina.close_browser_service()
+        scrape_seconds = time.perf_counter() - started
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            flow.finish()
+    elapsed = time.perf_counter() - started
+
+    stats = download_images.download_stats
+    rows = sum(count_rows(f"{category}_bags.csv")[0] for category in categories)
+    return {
+        'seconds': elapsed,
+        'scrape_seconds': scrape_seconds,
+        'products': rows,
+        'images': stats['images'],
+        'failed': stats['failed'],
+        'loaded': flow.stats['loaded'],
+        'indexed': flow.stats['indexed'],
+        'stalls': flow.stats['stalls'],
+        'products_per_second': rows / elapsed,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_load():
+    """Load the CSVs the image stage completed into SQLite, as a separate step would"""
+    import load_catalog
+
+    conn, dialect = load_catalog.connect_sqlite('catalog.db')
+    started = time.perf_counter()
+    try:
+        result = load_catalog.load_catalog(conn, dialect, load_catalog.read_catalog('.'))
+    finally:
+        conn.close()
+    return {'seconds': time.perf_counter() - started, 'loaded': result['loaded']}
+
+def lookup(results, dotted):
+    value = results
+    for part in dotted.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def print_comparison(old, new):
+    """Print each compared metric of two results files side by side"""
+    print(f"\nCompared with {old.get('commit') or 'previous run'}:")
+    for metric, higher_is_better in COMPARED_METRICS:
+        before, after = lookup(old, metric), lookup(new, metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        better = (change > 0) == higher_is_better if change else None
+        verdict = '' if better is None else (' better' if better else ' worse')
+        print(f"- {metric}: {before:.2f} -> {after:.2f} ({change:+.1f}%{verdict})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--categories', default=','.join(CATEGORY_PATHS),
+                        help='comma-separated categories to scrape')
+    parser.add_argument('--concurrency', type=int, default=bananina.DETAIL_CONCURRENCY)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='scrape through the task queue with this many worker processes')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--image-kb', type=int, default=48)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host-rate', type=float,
+                        help='scraper requests per second against the server (default: bananina.HOST_RATE)')
+    parser.add_argument('--skip-images', action='store_true')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='overlap scraping, image downloads and the database load (pipeline.py)')
+    parser.add_argument('--output', default='replay_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare with')
+    args = parser.parse_args()
+
+    categories = [category.strip() for category in args.categories.split(',') if category.strip()]
+    catalog = fixtures.load_catalog()
+    unknown = [category for category in categories if category not in catalog]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    if args.host_rate is not None:
+        bananina.HOST_RATE = args.host_rate
+
+    options = {
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'error_rate': args.error_rate,
+        'image_kb': args.image_kb,
+        'seed': args.seed
+    }
+    output = Path(args.output).resolve()
+    process, base_url = start_server(options)
+    original_dir = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix='bananina-replay-') as work_dir:
+            os.chdir(work_dir)
+            print(f"Replaying {', '.join(categories)} against {base_url}")
+            scrape = images = load = flow = None
+            if args.pipeline:
+                flow = run_pipeline(base_url, categories, args.concurrency)
+                print(f"Pipelined {flow['products']} products, {flow['images']} images and "
+                      f"{flow['loaded']} database rows in {flow['seconds']:.2f}s "
+                      f"(scraping done after {flow['scrape_seconds']:.2f}s)")
+            elif args.workers:
+                scrape = run_sharded_scrape(base_url, categories, args.workers, args.concurrency)
+            else:
+                scrape = run_scrape(base_url, categories, args.concurrency)
+            if not args.pipeline:
+                print(f"Scraped {scrape['products']} products from {scrape['pages']} pages in {scrape['seconds']:.2f}s")
+            if not args.pipeline and not args.skip_images:
+                images = run_images(categories)
+                print(f"Downloaded {images['images']} images in {images['seconds']:.2f}s")
+                load = run_load()
+                print(f"Loaded {load['loaded']} rows into SQLite in {load['seconds']:.2f}s")
+            os.chdir(original_dir)
+    finally:
+        os.chdir(original_dir)
+        process.terminate()
+        process.join()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': dict(options, categories=categories, concurrency=args.concurrency, workers=args.workers,
+                       parser=bananina.PARSER_BACKEND, http_first=bananina.HTTP_FIRST,
+                       host_rate=bananina.HOST_RATE),
+        'scrape': scrape,
+        'images': images,
+        'load': load,
+        'pipeline': flow,
+        'total_seconds': flow['seconds'] if flow else sum(
+            stage['seconds'] for stage in (scrape, images, load) if stage
+        ),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    print(f"\n{'='*50}")
+    if scrape:
+        print(f"Pages/s: {scrape['pages_per_second']:.1f}, products/s: {scrape['products_per_second']:.1f}")
+        print(f"Page latency p50: {scrape['latency_p50_ms']:.1f} ms, p95: {scrape['latency_p95_ms']:.1f} ms")
+        print(f"Rows with N/A details: {scrape['na_rows']}, "
+              f"detail requests that succeeded after a retry: {scrape.get('detail_ok_after_retry', 'n/a')}")
+    if flow:
+        print(f"Products/s end to end: {flow['products_per_second']:.1f}, "
+              f"scraper held back {flow['stalls']} times by a full image queue")
+    print(f"Total: {results['total_seconds']:.2f}s")
+    if images:
+        print(f"Images/s: {images['images_per_second']:.1f}, MB/s: {images['megabytes_per_second']:.2f}, "
+              f"failed: {images['failed']}")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print_comparison(json.load(file), results)
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
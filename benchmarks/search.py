@@ -0,0 +1,161 @@
+"""Compare storefront search through the search index with the LIKE scans it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.search [--scale N] [--changed N] [--queries N] [--repeat N]
+
+Loads data/*_bags.csv into a temporary SQLite database (repeated --scale
+times with renamed copies to stand in for a bigger catalog), builds the
+index with search_index.py and times the count and first-page queries of
+pages/products.php for a mix of brand, word, prefix, two-word and missing
+searches. --changed edits that many products after the build, so they are
+searched with LIKE beside the index as until the next rebuild. It also
+reports how many of the LIKE hits the index finds; the index holds every
+suffix of a word, so it should find all of them.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import load_catalog
+import search_index
+
+PAGE_SIZE = 12
+
+LIKE_CONDITION = search_index.LIKE_CONDITION.format('?')
+
+def scaled_rows(scale):
+    """Return the catalog rows, plus scale - 1 renamed copies of each"""
+    rows = load_catalog.read_catalog()
+    scaled = list(rows)
+    for copy in range(1, scale):
+        for category, row in rows:
+            scaled.append((category, dict(row, Name=f"{row['Name']} {copy}", SKU=f"{row['SKU']}-{copy}")))
+    return scaled
+
+def build_database(path, scale, changed):
+    conn, dialect = load_catalog.connect_sqlite(path)
+    load_catalog.load_catalog(conn, dialect, scaled_rows(scale))
+    # updated_at has one-second resolution; products of the build's own second are searched with LIKE
+    time.sleep(1)
+    search_index.rebuild_index(conn, dialect)
+    conn.execute("UPDATE products SET description = description || ' ' WHERE id IN "
+                 "(SELECT id FROM products ORDER BY id LIMIT ?)", [changed])
+    conn.commit()
+    return conn, dialect
+
+def pick_queries(conn, count, seed):
+    """Return a reproducible mix of searches drawn from the catalog"""
+    rng = random.Random(seed)
+    brands = [name for (name,) in conn.execute("SELECT name FROM brands ORDER BY name")]
+    words = sorted({word for (name,) in conn.execute("SELECT name FROM products")
+                    for word in search_index.tokenize(name) if len(word) > 3 and not word.isdigit()})
+    queries = []
+    for index in range(count):
+        kind = index % 5
+        if kind == 0:
+            queries.append(rng.choice(brands))
+        elif kind == 1:
+            queries.append(rng.choice(words))
+        elif kind == 2:
+            queries.append(rng.choice(words)[:4])
+        elif kind == 3:
+            queries.append(f"{rng.choice(brands)} {rng.choice(words)}")
+        else:
+            queries.append(f"zq{rng.choice(words)}")
+    return queries
+
+def like_search(conn, text):
+    """The LIKE count and first page of pages/products.php"""
+    params = [f"%{text}%"] * 3
+    total = conn.execute(
+        "SELECT COUNT(DISTINCT p.id) FROM products p LEFT JOIN brands b ON p.brand_id = b.id "
+        f"WHERE p.is_active = 1 AND {LIKE_CONDITION}", params
+    ).fetchone()[0]
+    ids = [row[0] for row in conn.execute(
+        "SELECT p.id FROM products p LEFT JOIN brands b ON p.brand_id = b.id "
+        f"WHERE p.is_active = 1 AND {LIKE_CONDITION} ORDER BY p.created_at DESC LIMIT ?, ?",
+        params + [0, PAGE_SIZE]
+    )]
+    return total, ids
+
+def index_search(conn, dialect, built_at, text):
+    """The same count and first page, filtered through the search index"""
+    changed = search_index.changed_since(conn, dialect, built_at)
+    condition, params = search_index.search_condition(text, dialect, built_at, changed)
+    total = conn.execute(
+        "SELECT COUNT(DISTINCT p.id) FROM products p LEFT JOIN brands b ON p.brand_id = b.id "
+        f"WHERE p.is_active = 1 AND {condition}", params
+    ).fetchone()[0]
+    ids = [row[0] for row in conn.execute(
+        "SELECT p.id FROM products p LEFT JOIN brands b ON p.brand_id = b.id "
+        f"WHERE p.is_active = 1 AND {condition} ORDER BY p.created_at DESC LIMIT ?, ?",
+        params + [0, PAGE_SIZE]
+    )]
+    return total, ids
+
+def matching_ids(conn, condition, params):
+    return {row[0] for row in conn.execute(
+        "SELECT p.id FROM products p LEFT JOIN brands b ON p.brand_id = b.id "
+        f"WHERE p.is_active = 1 AND {condition}", params
+    )}
+
+def time_queries(search, queries, repeat):
+    """Return the milliseconds each query took, best of repeat runs"""
+    timings = []
+    for query in queries:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            search(query)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1, help='copies of the catalog to load')
+    parser.add_argument('--changed', type=int, default=0, help='products edited after the index build')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bananina-search-') as work_dir:
+        conn, dialect = build_database(os.path.join(work_dir, 'catalog.db'), args.scale, args.changed)
+        try:
+            products = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            terms = conn.execute("SELECT COUNT(*) FROM search_terms").fetchone()[0]
+            postings = conn.execute("SELECT COUNT(*) FROM search_postings").fetchone()[0]
+            built_at = search_index.index_built_at(conn)
+            queries = pick_queries(conn, args.queries, args.seed)
+            print(f"{products} products, {terms} terms, {postings} postings, {len(queries)} queries")
+
+            like_ms = time_queries(lambda query: like_search(conn, query), queries, args.repeat)
+            index_ms = time_queries(lambda query: index_search(conn, dialect, built_at, query), queries, args.repeat)
+
+            like_hits = index_hits = found = 0
+            for query in queries:
+                expected = matching_ids(conn, LIKE_CONDITION, [f"%{query}%"] * 3)
+                got = matching_ids(conn, *search_index.search_condition(query, dialect, built_at))
+                like_hits += len(expected)
+                index_hits += len(got)
+                found += len(expected & got)
+        finally:
+            conn.close()
+
+    print(f"\n{'search':<8}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, timings in (('LIKE', like_ms), ('index', index_ms)):
+        ordered = sorted(timings)
+        p95 = ordered[min(len(ordered) - 1, round(0.95 * len(ordered)) - 1)]
+        print(f"{name:<8}{statistics.median(timings):>10.2f}{p95:>10.2f}{statistics.mean(timings):>10.2f}")
+    print(f"\nSpeedup (mean): {statistics.mean(like_ms) / statistics.mean(index_ms):.1f}x")
+    print(f"LIKE hits: {like_hits}, index hits: {index_hits}, LIKE hits the index finds: "
+          f"{found / like_hits * 100 if like_hits else 100:.1f}%")
+
+if __name__ == '__main__':
+    main()
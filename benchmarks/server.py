@@ -0,0 +1,174 @@
+"""Serve generated banananina.co.id pages from data/*.csv on localhost.
+
+Run from the repository root:
+
+    python -m benchmarks.server [--port 8765] [--latency-ms 50] [--error-rate 0.05]
+
+Category listings are served at the paths of bananina.get_category_urls()
+with ?p=N pagination, product pages at the paths of their Product Link,
+and images under /media/. Every response can be delayed and a share of
+requests answered with 503, seeded so runs are repeatable.
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks import fixtures
+
+# Paths of the live category listings, as in bananina.get_category_urls()
+CATEGORY_PATHS = {
+    'backpacks': '/bags/backpacks.html',
+    'clutches': '/bags/clutches.html',
+    'crossbody': '/bags/crossbody-bags.html',
+    'laptop': '/bags/laptop-bags.html',
+    'satchels': '/bags/satchels.html',
+    'shoulder': '/bags/shoulder-bags.html',
+    'totes': '/bags/totes.html',
+    'travel': '/bags/travel-bags.html'
+}
+
+MEDIA_PATH = '/media/'
+
+class FixtureServer(ThreadingHTTPServer):
+    """HTTP stand-in for the shop and its media host.
+
+    latency_ms and jitter_ms delay every response; error_rate is the share
+    of requests answered with 503 Service Unavailable. Served requests are
+    counted per kind in stats.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, catalog=None, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 image_kb=48, seed=0):
+        super().__init__(address, FixtureHandler)
+        self.catalog = catalog if catalog is not None else fixtures.load_catalog()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.image_bytes = image_kb * 1024
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'listing': 0, 'detail': 0, 'image': 0, 'errors': 0, 'not_found': 0}
+
+        self.listings = {CATEGORY_PATHS[category]: rows for category, rows in self.catalog.items()
+                         if category in CATEGORY_PATHS}
+        self.details = {}
+        for rows in self.catalog.values():
+            for row in rows:
+                self.details.setdefault(urlparse(row['Product Link']).path, row)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def media_url(self):
+        # A second name for the same server, so clients see the media host as a separate host
+        return f"http://localhost:{self.server_address[1]}{MEDIA_PATH}"
+
+    def category_url(self, category):
+        return self.url + CATEGORY_PATHS[category]
+
+    def draw(self):
+        """Return (delay in seconds, whether to fail) for one request"""
+        with self.lock:
+            delay = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+            return delay, self.random.random() < self.error_rate
+
+    def count(self, kind):
+        with self.lock:
+            self.stats[kind] += 1
+
+    def image(self, path):
+        """Return stable fake image bytes for a path"""
+        seed = hashlib.sha256(path.encode('utf-8')).digest()
+        return (seed * (self.image_bytes // len(seed) + 1))[:self.image_bytes]
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        delay, fail = server.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            server.count('errors')
+            self.send_body(503, b'Service Unavailable', 'text/plain')
+            return
+
+        if parsed.path.startswith(MEDIA_PATH):
+            server.count('image')
+            etag = '"' + hashlib.sha1(parsed.path.encode('utf-8')).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_body(200, server.image(parsed.path), 'image/jpeg', {'ETag': etag})
+            return
+
+        if parsed.path in server.listings:
+            rows = server.listings[parsed.path]
+            page = int(parse_qs(parsed.query).get('p', ['1'])[0])
+            if 1 <= page <= fixtures.page_count(rows):
+                server.count('listing')
+                content = fixtures.listing_page_html(rows, page, site_url=server.url,
+                                                     media_url=server.media_url)
+                self.send_body(200, content.encode('utf-8'), 'text/html; charset=utf-8')
+                return
+
+        row = server.details.get(parsed.path)
+        if row is not None:
+            server.count('detail')
+            content = fixtures.detail_page_html(row)
+            self.send_body(200, content.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+
+        server.count('not_found')
+        self.send_body(404, b'Not Found', 'text/plain')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--image-kb', type=int, default=48)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FixtureServer((args.host, args.port), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, image_kb=args.image_kb, seed=args.seed)
+    print(f"Serving fixtures on {server.url}")
+    for category in sorted(server.catalog):
+        print(f"- {category}: {server.category_url(category)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
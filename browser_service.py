@@ -0,0 +1,353 @@
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+
+class _Slot:
+    """A browser context with its single page and how many navigations it has served"""
+    __slots__ = ('context', 'page', 'navigations', 'lent_at', 'hang_seconds', 'retire', 'killed')
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.navigations = 0
+        self.lent_at = None
+        self.hang_seconds = None
+        # retire: discard when returned; killed: the watchdog closed it under its borrower
+        self.retire = False
+        self.killed = False
+
+def _child_pids(root_pid):
+    """Return the pids of every process descending from root_pid, read from /proc"""
+    parents = {}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/stat', 'rb') as file:
+                stat = file.read()
+        except OSError:
+            continue  # The process exited while we looked
+        # The command name may contain spaces and parentheses, the fields after it don't
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        parents.setdefault(ppid, []).append(int(entry.name))
+
+    found = []
+    pending = [root_pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        found += children
+        pending += children
+    return found
+
+def _process_memory_kb(pid):
+    """Return a process's proportional set size in kB, or its RSS where PSS isn't available"""
+    for path, key in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path) as file:
+                for line in file:
+                    if line.startswith(key):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+def _driver_pid(playwright):
+    """Return the pid of the Playwright driver process, or None if it can't be found"""
+    # Playwright has no public API for it; the driver is the subprocess behind its connection
+    try:
+        return playwright._impl_obj._connection._transport._proc.pid
+    except AttributeError:
+        return None
+
+def browser_memory_mb(driver_pid):
+    """Return the memory of the Playwright driver and the Chromium processes it started, in MB.
+
+    Only the driver's process tree is counted, not other children of this
+    process such as image workers. Chromium's processes share a lot of
+    pages, so their PSS is summed rather than their RSS. Returns None
+    where /proc isn't available or the driver's pid is unknown.
+    """
+    if driver_pid is None or not os.path.isdir('/proc/self'):
+        return None
+    return sum(_process_memory_kb(pid) for pid in [driver_pid] + _child_pids(driver_pid)) / 1024
+
+class BrowserService:
+    """Own one Chromium process and lend its pages to listing and detail work.
+
+    Playwright objects belong to the event loop that created them, so the
+    service runs its own loop on a background thread. Synchronous callers
+    (the category threads in scrape_main) hand coroutines to run(), which
+    blocks until they finish. Chromium itself is only launched when the
+    first page is requested.
+
+    When blocked_resource_types or first_party_hosts are given, every
+    context intercepts its requests and aborts subresources of those types
+    or from other hosts. Document navigations are always let through.
+
+    While Chromium runs, a watchdog samples its memory every
+    watchdog_interval seconds. Above 80% of max_memory_mb it recycles
+    every context; at max_memory_mb it restarts Chromium. A page lent for
+    longer than its hang deadline has its context closed, and Chromium is
+    restarted after restart_after_hangs hangs or when the median of the
+    recent navigations gets slower than slow_navigation_seconds. Work run
+    through browse() is retried on a fresh page when the watchdog pulled
+    its page away. Samples and actions are appended to log_path as JSON
+    lines.
+    """
+
+    def __init__(self, user_agent, launch_args=None, viewport=None, max_pages=8, max_navigations=50,
+                 blocked_resource_types=None, first_party_hosts=None, max_memory_mb=0,
+                 hang_seconds=60, slow_navigation_seconds=0, restart_after_hangs=3,
+                 watchdog_interval=5, log_path=None):
+        self.user_agent = user_agent
+        self.launch_args = launch_args or []
+        self.viewport = viewport
+        self.max_pages = max_pages
+        self.max_navigations = max_navigations
+        self.blocked_resource_types = set(blocked_resource_types or [])
+        self.first_party_hosts = list(first_party_hosts or [])
+        self.max_memory_mb = max_memory_mb
+        self.hang_seconds = hang_seconds
+        self.slow_navigation_seconds = slow_navigation_seconds
+        self.restart_after_hangs = restart_after_hangs
+        self.watchdog_interval = watchdog_interval
+        self.log_path = Path(log_path) if log_path else None
+        self.stats = {'launches': 0, 'contexts': 0, 'recycled': 0, 'navigations': 0, 'blocked': 0,
+                      'hung': 0, 'restarts': 0, 'retried': 0, 'peak_memory_mb': 0.0}
+
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._lent = set()
+        self._latencies = deque(maxlen=20)
+        self._hangs = 0
+        self._acted_at = {}
+        self._watchdog = None
+        self._log = None
+        self._pages = asyncio.Semaphore(max_pages)
+        self._launch_lock = asyncio.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='browser-service', daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the service loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._browser is None:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(
+                    headless=True,
+                    args=self.launch_args
+                )
+                self.stats['launches'] += 1
+                if self._watchdog is None:
+                    self._watchdog = asyncio.get_running_loop().create_task(self._watch())
+        return self._browser
+
+    async def _new_slot(self):
+        browser = await self._ensure_browser()
+        options = {'user_agent': self.user_agent}
+        if self.viewport:
+            options['viewport'] = self.viewport
+        context = await browser.new_context(**options)
+        if self.blocked_resource_types or self.first_party_hosts:
+            await context.route('**/*', self._filter_request)
+        self.stats['contexts'] += 1
+        return _Slot(context, await context.new_page())
+
+    def _is_first_party(self, url):
+        if not self.first_party_hosts:
+            return True
+        host = urlparse(url).hostname or ''
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.first_party_hosts)
+
+    async def _filter_request(self, route):
+        request = route.request
+        if not request.is_navigation_request() and (
+            request.resource_type in self.blocked_resource_types
+            or not self._is_first_party(request.url)
+        ):
+            self.stats['blocked'] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _discard(self, slot):
+        try:
+            await slot.context.close()
+        except:
+            pass  # The context may already be gone with its browser
+
+    @asynccontextmanager
+    async def _lend(self, hang_seconds=None):
+        async with self._pages:
+            slot = self._idle.pop() if self._idle else await self._new_slot()
+            slot.lent_at = time.monotonic()
+            slot.hang_seconds = hang_seconds or self.hang_seconds
+            self._lent.add(slot)
+            try:
+                yield slot
+            finally:
+                self._lent.discard(slot)
+                if not slot.killed:
+                    self._latencies.append(time.monotonic() - slot.lent_at)
+                slot.navigations += 1
+                self.stats['navigations'] += 1
+                if slot.killed or slot.retire or slot.navigations >= self.max_navigations or slot.page.is_closed():
+                    # A fresh context drops the memory the old one accumulated
+                    self.stats['recycled'] += 1
+                    await self._discard(slot)
+                else:
+                    self._idle.append(slot)
+
+    async def browse(self, work, hang_seconds=None, retries=1):
+        """Await work(page) on a lent page and return its result.
+
+        If the watchdog closes the page under the work, because it hung or
+        Chromium was restarted, the result or error is dropped and work runs
+        again on a fresh page, up to retries more times.
+        """
+        attempt = 0
+        while True:
+            async with self._lend(hang_seconds) as slot:
+                try:
+                    result = await work(slot.page)
+                except Exception:
+                    if not slot.killed or attempt >= retries:
+                        raise
+                else:
+                    if not slot.killed or attempt >= retries:
+                        return result
+                url = slot.page.url
+            attempt += 1
+            self.stats['retried'] += 1
+            self._record('retry', attempt=attempt, url=url)
+
+    def _record(self, event, **fields):
+        """Append a watchdog event to the log, printing the actions"""
+        if event != 'sample':
+            details = ', '.join(f"{key}={value}" for key, value in fields.items())
+            print(f"\nBrowser watchdog: {event}" + (f" ({details})" if details else ''))
+        if self.log_path is None:
+            return
+        if self._log is None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._log.write(json.dumps({'ts': round(time.time(), 3), 'event': event, **fields}) + '\n')
+        self._log.flush()
+
+    async def _kill(self, slot):
+        """Close a lent slot's context so whatever awaits its page fails now"""
+        slot.killed = True
+        await self._discard(slot)
+
+    async def _recycle(self, reason, memory_mb):
+        """Drop the idle contexts now and the lent ones as they come back"""
+        self._record('recycle', reason=reason, memory_mb=round(memory_mb or 0, 1),
+                     idle=len(self._idle), lent=len(self._lent))
+        while self._idle:
+            self.stats['recycled'] += 1
+            await self._discard(self._idle.pop())
+        for slot in self._lent:
+            slot.retire = True
+
+    async def _restart(self, reason, memory_mb):
+        """Close Chromium under every lent page; the next page request launches a new one"""
+        self._record('restart', reason=reason, memory_mb=round(memory_mb or 0, 1), lent=len(self._lent))
+        async with self._launch_lock:
+            for slot in list(self._lent):
+                slot.killed = True
+            self._idle.clear()
+            try:
+                if self._browser:
+                    await self._browser.close()
+            except:
+                pass  # A wedged browser may fail to close cleanly; its process goes with the driver
+            self._browser = None
+            self.stats['restarts'] += 1
+        self._latencies.clear()
+        self._hangs = 0
+
+    async def _watch(self):
+        """Sample Chromium's memory and lent pages, acting on the first threshold crossed"""
+        while True:
+            await asyncio.sleep(self.watchdog_interval)
+            if self._browser is None:
+                continue
+            now = time.monotonic()
+            for slot in list(self._lent):
+                if not slot.killed and now - slot.lent_at > slot.hang_seconds:
+                    self.stats['hung'] += 1
+                    self._hangs += 1
+                    self._record('hung', seconds=round(now - slot.lent_at, 1), url=slot.page.url)
+                    await self._kill(slot)
+
+            memory_mb = await asyncio.to_thread(browser_memory_mb, _driver_pid(self._playwright))
+            latency = statistics.median(self._latencies) if len(self._latencies) >= 5 else None
+            if memory_mb is not None:
+                self.stats['peak_memory_mb'] = max(self.stats['peak_memory_mb'], memory_mb)
+            self._record('sample', memory_mb=None if memory_mb is None else round(memory_mb, 1),
+                         lent=len(self._lent), idle=len(self._idle),
+                         median_navigation_s=None if latency is None else round(latency, 2))
+
+            action = self._action(memory_mb, latency)
+            if action is None:
+                continue
+            act, reason = action
+            # Give the last action time to show in the samples; a recycle never holds back a restart
+            waiting_on = [self._restart] if act == self._restart else [self._restart, self._recycle]
+            cooldown = 6 * self.watchdog_interval
+            if all(now - self._acted_at.get(method.__name__, -cooldown) >= cooldown for method in waiting_on):
+                self._acted_at[act.__name__] = now
+                await act(reason, memory_mb)
+
+    def _action(self, memory_mb, latency):
+        """Return the (method, reason) the latest sample calls for, or None"""
+        if self.max_memory_mb and memory_mb is not None and memory_mb >= self.max_memory_mb:
+            return self._restart, 'memory'
+        if self.restart_after_hangs and self._hangs >= self.restart_after_hangs:
+            return self._restart, 'hangs'
+        if self.slow_navigation_seconds and latency is not None and latency > self.slow_navigation_seconds:
+            return self._restart, 'slow navigations'
+        if self.max_memory_mb and memory_mb is not None and memory_mb >= 0.8 * self.max_memory_mb:
+            return self._recycle, 'memory'
+        return None
+
+    async def _shutdown(self):
+        if self._watchdog:
+            self._watchdog.cancel()
+            self._watchdog = None
+        if self._log:
+            self._log.close()
+            self._log = None
+        while self._idle:
+            await self._discard(self._idle.pop())
+        try:
+            if self._browser:
+                await self._browser.close()
+            if self._playwright:
+                await self._playwright.stop()
+        except:
+            pass  # Ignore any errors during browser closing
+        self._browser = None
+        self._playwright = None
+
+    def close(self):
+        """Close Chromium and stop the service loop"""
+        self.run(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
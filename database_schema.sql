@@ -85,7 +85,8 @@ CREATE TABLE products (
     INDEX idx_category (category_id),
     INDEX idx_price (price),
     INDEX idx_stock (stock),
-    INDEX idx_active_deleted (is_active, deleted_at)
+    INDEX idx_active_deleted (is_active, deleted_at),
+    INDEX idx_updated (updated_at)
 );
 
 -- Product Galleries table
@@ -307,6 +308,34 @@ CREATE TABLE wishlist (
     UNIQUE KEY unique_wishlist_item (user_id, product_id)
 );
 
+-- Search index and facet counts, rebuilt by search_index.py after each catalog load.
+-- Terms are every suffix of the catalog's words, so a prefix range finds text inside a word.
+-- Terms are compared byte for byte so accented and plain spellings stay separate keys.
+CREATE TABLE search_terms (
+    id INT PRIMARY KEY,
+    term VARCHAR(64) COLLATE utf8mb4_bin NOT NULL UNIQUE,
+    products INT NOT NULL
+);
+
+CREATE TABLE search_postings (
+    term_id INT NOT NULL,
+    product_id INT NOT NULL,
+    PRIMARY KEY (term_id, product_id)
+);
+
+CREATE TABLE search_facets (
+    facet VARCHAR(20) NOT NULL,
+    value VARCHAR(50) NOT NULL,
+    label VARCHAR(100) NOT NULL,
+    products INT NOT NULL,
+    PRIMARY KEY (facet, value)
+);
+
+-- When the index was built; products updated since then are searched with LIKE
+CREATE TABLE search_builds (
+    built_at TIMESTAMP NOT NULL
+);
+
 -- Update the image paths in product_galleries table
 UPDATE product_galleries 
 SET image_url = CONCAT('/assets/images', SUBSTRING(image_url, LOCATE('images/', image_url) + 6))
@@ -1,18 +1,52 @@
 import pandas as pd
 import os
+import hashlib
 import requests
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs
 import time
 import concurrent.futures
+import threading
+from collections import Counter
+from itertools import zip_longest
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from image_store import ImageStore
+from image_variants import VariantStage, pillow_available
+import instrumentation
+from host_scheduler import request, scheduler_stats, print_scheduler_stats
 
-# Define the base directory for images
-BASE_DIR = Path("C:/laragon/www/Bananina/public/assets/images")
+# Define the base directory for images: the storefront's public/assets/images
+BASE_DIR = Path(os.environ.get('BANANINA_IMAGES_DIR', "C:/laragon/www/Bananina/public/assets/images"))
 
 # Create directories if they don't exist
 (BASE_DIR / "backpacks" / "primary").mkdir(parents=True, exist_ok=True)
 (BASE_DIR / "backpacks" / "hover").mkdir(parents=True, exist_ok=True)
 
+# Images downloaded at the same time across all CSV files
+MAX_WORKERS = int(os.environ.get('BANANINA_IMAGE_WORKERS', 32))
+
+# Downloads allowed at the same time against a single host; the limiter adapts below this
+HOST_CONCURRENCY = int(os.environ.get('BANANINA_HOST_CONCURRENCY', 8))
+
+# Downloads started per second against a single host (0 = no rate cap)
+IMAGE_HOST_RATE = float(os.environ.get('BANANINA_IMAGE_HOST_RATE', 0))
+
+# Content-addressed image files and their URL index
+IMAGE_STORE_DIR = Path(os.environ.get('BANANINA_IMAGE_STORE', os.path.join('images', 'store')))
+
+# Resize downloaded images into storefront variants while downloads continue
+GENERATE_VARIANTS = os.environ.get('BANANINA_IMAGE_VARIANTS', '1') != '0'
+
+# Images, bytes, skips and failures of the current run
+download_stats = Counter()
+_download_stats_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
 def get_headers():
     return {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.109 Safari/537.36',
@@ -21,36 +55,144 @@ def get_headers():
         'Connection': 'keep-alive',
     }
 
-def download_image(url, folder_path, filename):
-    """Download image from URL and save it to appropriate folder"""
+def count_download(kind, amount=1):
+    """Add to one of the run's download counters"""
+    with _download_stats_lock:
+        download_stats[kind] += amount
+    instrumentation.count(f"images_{kind}", amount)
+
+def get_session():
+    """Return the shared keep-alive client, speaking HTTP/2 when httpx and h2 are installed"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            try:
+                import httpx
+                import h2  # noqa: F401
+                _session = httpx.Client(
+                    http2=True,
+                    headers=get_headers(),
+                    timeout=10,
+                    limits=httpx.Limits(max_connections=MAX_WORKERS, max_keepalive_connections=MAX_WORKERS)
+                )
+            except ImportError:
+                session = requests.Session()
+                session.headers.update(get_headers())
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=MAX_WORKERS)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+        return _session
+
+def get_image_store():
+    """Return the shared image store, opening it on first use"""
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            _image_store = ImageStore(IMAGE_STORE_DIR)
+        return _image_store
+
+def stream_to_file(url, filepath, headers=None):
+    """Download url into filepath through the shared client.
+
+    Returns (status, response headers, bytes written, sha256 hex digest).
+    A 304 Not Modified answer writes nothing.
+    """
+    session = get_session()
+    size = 0
+    digest = hashlib.sha256()
+    
+    if isinstance(session, requests.Session):
+        response_context = session.get(url, headers=headers, stream=True, timeout=10)
+    else:
+        response_context = session.stream('GET', url, headers=headers)
+    
+    with response_context as response:
+        if response.status_code == 304:
+            return 304, response.headers, 0, None
+        response.raise_for_status()
+        chunks = (
+            response.iter_content(chunk_size=8192)
+            if isinstance(session, requests.Session)
+            else response.iter_bytes(chunk_size=8192)
+        )
+        with open(filepath, 'wb') as f:
+            for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+    return response.status_code, response.headers, size, digest.hexdigest()
+
+def split_version(url):
+    """Split an image URL into its address without the query and its v= token"""
+    parsed = urlparse(url)
+    version = parse_qs(parsed.query).get('v', [None])[0]
+    return parsed._replace(query='', fragment='').geturl(), version
+
+def download_image(url):
+    """Return the store path of an image, downloading or revalidating it when needed"""
     try:
         if url == "N/A" or not url.startswith('http'):
             return None
-            
-        # Create folder if it doesn't exist
-        Path(folder_path).mkdir(parents=True, exist_ok=True)
         
-        # Create filename
-        filepath = Path(folder_path) / filename
+        store = get_image_store()
+        key, version = split_version(url)
         
-        # Skip if file already exists
-        if filepath.exists():
-            print(f"Image already exists: {filepath}")
-            return str(filepath)
+        # Both images of a product are often the same URL; fetch it once
+        with store.url_lock(key):
+            entry = store.lookup(key)
+            cached = entry is not None and store.path(entry['filename']).exists()
+            
+            # Same v= token as last time: the stored file is current
+            if cached and entry['version'] == version:
+                print(f"Image up to date: {store.path(entry['filename'])}")
+                count_download('skipped')
+                return str(store.path(entry['filename']))
+            
+            # The token changed, so ask the server whether the bytes did too
+            headers = {}
+            if cached and entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if cached and entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+            
+            partial_path = store.temp_path()
+            try:
+                (status, response_headers, size, digest), _ = request(
+                    url, lambda: stream_to_file(url, partial_path, headers),
+                    rate=IMAGE_HOST_RATE, max_concurrency=HOST_CONCURRENCY, label='image',
+                    status=lambda result: result[:2]
+                )
+            except Exception:
+                if partial_path.exists():
+                    os.remove(partial_path)
+                raise
+            
+            if status == 304:
+                store.record(key, version, entry['filename'], entry['etag'], entry['last_modified'])
+                print(f"Image not modified: {store.path(entry['filename'])}")
+                count_download('revalidated')
+                return str(store.path(entry['filename']))
+            
+            ext = os.path.splitext(urlparse(url).path)[1] or '.jpg'
+            filename, created = store.add_file(partial_path, digest, ext)
+            store.record(
+                key, version, filename,
+                response_headers.get('ETag'),
+                response_headers.get('Last-Modified')
+            )
+            count_download('images')
+            count_download('bytes', size)
+            if not created:
+                count_download('deduplicated')
         
-        # Download image with session
-        with requests.get(url, headers=get_headers(), stream=True, timeout=10) as response:
-            response.raise_for_status()
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        
-        print(f"Downloaded: {filepath}")
-        return str(filepath)
+        print(f"Downloaded: {store.path(filename)}")
+        return str(store.path(filename))
         
     except Exception as e:
         print(f"Error downloading image {url}: {str(e)}")
+        count_download('failed')
         return None
 
 def process_row(args):
@@ -58,61 +200,108 @@ def process_row(args):
     index, row, category = args
     results = {'primary': None, 'hover': None}
     
-    for image_type in ['primary', 'hover']:
-        url = row[f'{image_type.title()} Image']
-        if url != 'N/A':
-            folder_path = os.path.join('images', category, image_type)
-            # Clean filename
-            clean_name = "".join(c for c in row['Name'] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            ext = os.path.splitext(urlparse(url).path)[1] or '.jpg'
-            filename = f"{clean_name}_{image_type}{ext}"
-            
-            local_path = download_image(url, folder_path, filename)
-            results[image_type] = local_path
+    with instrumentation.scope(category):
+        for image_type in ['primary', 'hover']:
+            url = row[f'{image_type.title()} Image']
+            if isinstance(url, str) and url != 'N/A':
+                with instrumentation.timer('image.download'):
+                    results[image_type] = download_image(url)
             
     return index, results
 
-def process_csv_file(csv_file):
-    """Process a single CSV file and download its images"""
-    try:
-        # Get category name from filename
-        category = csv_file.replace('_bags.csv', '')
-        print(f"\nProcessing {category} category...")
-        
-        # Read CSV file
-        df = pd.read_csv(csv_file)
-        total_products = len(df)
-        print(f"Found {total_products} products")
-        
-        # Create arguments for parallel processing
-        args_list = [(index, row, category) for index, row in df.iterrows()]
+def save_csv(df, csv_file):
+    """Write the DataFrame over csv_file through a temporary file"""
+    temp_file = f"{csv_file}.tmp"
+    df.to_csv(temp_file, index=False)
+    os.replace(temp_file, csv_file)
+
+def download_all(csv_files, variants=None):
+    """Download the images of every CSV file through one shared worker pool.
+
+    Rows of all files are interleaved, so small categories finish alongside
+    the large ones instead of waiting for them. Each CSV is saved with its
+    local paths as soon as its last row is done, and each downloaded image
+    is handed to the variants stage if one is given. Returns a dict of
+    csv_file -> whether it was processed.
+    """
+    frames = {}
+    categories = {}
+    remaining = {}
+    results_by_file = {}
+    row_jobs = []
+    
+    for csv_file in csv_files:
+        try:
+            # Get category name from filename
+            category = os.path.basename(csv_file).replace('_bags.csv', '')
+            df = pd.read_csv(csv_file)
+            print(f"Found {len(df)} {category} products in {csv_file}")
+            frames[csv_file] = df
+            categories[csv_file] = category
+            remaining[csv_file] = len(df)
+            row_jobs.append([(csv_file, (index, row, category)) for index, row in df.iterrows()])
+        except Exception as e:
+            print(f"Error processing CSV file {csv_file}: {str(e)}")
+            results_by_file[csv_file] = False
+    
+    def finish(csv_file):
+        try:
+            save_csv(frames[csv_file], csv_file)
+            print(f"\nCompleted processing {csv_file}")
+            results_by_file[csv_file] = True
+        except Exception as e:
+            print(f"\nError saving CSV file {csv_file}: {str(e)}")
+            results_by_file[csv_file] = False
+    
+    for csv_file, count in remaining.items():
+        if count == 0:
+            finish(csv_file)
+    
+    jobs = [job for group in zip_longest(*row_jobs) for job in group if job]
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        future_to_file = {executor.submit(process_row, args): csv_file for csv_file, args in jobs}
         
-        # Process in parallel with ThreadPoolExecutor
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(process_row, args) for args in args_list]
+        # Process results as they complete
+        for done, future in enumerate(concurrent.futures.as_completed(future_to_file), 1):
+            csv_file = future_to_file[future]
+            df = frames[csv_file]
+            try:
+                index, results = future.result()
+                # Update DataFrame with local paths
+                if results['primary']:
+                    df.at[index, 'Primary Image Local Path'] = results['primary']
+                if results['hover']:
+                    df.at[index, 'Hover Image Local Path'] = results['hover']
+                if variants:
+                    for local_path in results.values():
+                        if local_path:
+                            variants.submit(local_path, categories[csv_file])
+            except Exception as e:
+                print(f"\nError processing row: {str(e)}")
             
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    index, results = future.result()
-                    # Update DataFrame with local paths
-                    if results['primary']:
-                        df.at[index, 'Primary Image Local Path'] = results['primary']
-                    if results['hover']:
-                        df.at[index, 'Hover Image Local Path'] = results['hover']
-                    
-                    print(f"\rProcessed {index + 1}/{total_products} products...", end='', flush=True)
-                except Exception as e:
-                    print(f"\nError processing row: {str(e)}")
-        
-        # Save updated CSV with local paths
-        df.to_csv(csv_file, index=False)
-        print(f"\nCompleted processing {category} category")
-        return True
-        
-    except Exception as e:
-        print(f"Error processing CSV file {csv_file}: {str(e)}")
-        return False
+            print(f"\rProcessed {done}/{len(jobs)} products...", end='', flush=True)
+            remaining[csv_file] -= 1
+            if remaining[csv_file] == 0:
+                finish(csv_file)
+    
+    return results_by_file
+
+def process_csv_file(csv_file):
+    """Process a single CSV file and download its images"""
+    return download_all([csv_file]).get(csv_file, False)
+
+def print_throughput(duration):
+    """Print how many images and megabytes per second the run downloaded"""
+    images = download_stats['images']
+    megabytes = download_stats['bytes'] / (1024 * 1024)
+    duration = max(duration, 1e-9)
+    print(f"Downloaded {images} images ({megabytes:.1f} MB), "
+          f"{download_stats['deduplicated']} already stored under another URL")
+    print(f"Up to date: {download_stats['skipped']}, not modified: {download_stats['revalidated']}, "
+          f"failed: {download_stats['failed']}")
+    print(f"Throughput: {images / duration:.1f} images/s, {megabytes / duration:.2f} MB/s")
+    print(f"Image store uses {get_image_store().disk_usage() / (1024 * 1024):.1f} MB")
 
 def main():
     # Get all CSV files in current directory
@@ -123,20 +312,22 @@ def main():
         return
     
     print(f"Found {len(csv_files)} CSV files to process")
-    successful = 0
-    failed = 0
+    download_stats.clear()
+    scheduler_stats.clear()
+    instrumentation.start('download_images')
     
     start_time = time.time()
     
-    for csv_file in csv_files:
-        print(f"\n{'='*50}")
-        print(f"Processing {csv_file}")
-        print(f"{'='*50}")
-        
-        if process_csv_file(csv_file):
-            successful += 1
+    variants = None
+    if GENERATE_VARIANTS:
+        if pillow_available():
+            variants = VariantStage()
         else:
-            failed += 1
+            print("Pillow is not installed, skipping image variants")
+    
+    results = download_all(csv_files, variants)
+    successful = sum(1 for ok in results.values() if ok)
+    failed = len(csv_files) - successful
     
     end_time = time.time()
     duration = end_time - start_time
@@ -145,6 +336,11 @@ def main():
     print(f"Processing completed in {duration:.2f} seconds!")
     print(f"Successfully processed: {successful} files")
     print(f"Failed to process: {failed} files")
+    print_throughput(duration)
+    print_scheduler_stats()
+    if variants:
+        variants.finish()
+    instrumentation.finish()
     print(f"{'='*50}")
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from bs4 import Tag
+
+from html_parsers import SelectolaxElement
+
+MEDIA_URL = 'https://media.banananina.id/catalog/product/'
+
+MEASUREMENT_NOTE = 'Product size is measured based on BANANANINA'
+
+_STEP = re.compile(r'^([\w-]+)?(?:\.([\w-]+))?(?:#([\w-]+))?(?:\[([\w-]+)\])?$')
+
+def text(element):
+    return element.get_text(strip=True)
+
+def href(element):
+    return element['href']
+
+def image_url(element):
+    """Return an img's lazy-loaded URL, rebuilding it from realfile behind a blank.jpg placeholder"""
+    url = element.get('data-src') or element.get('src', 'N/A')
+    if 'blank.jpg' in url:
+        real_file = element.get('realfile')
+        if real_file:
+            url = f"{MEDIA_URL}{real_file}"
+    return url
+
+@dataclass(frozen=True)
+class Field:
+    """One extracted value.
+
+    selectors are alternatives in priority order, each a chain of simple
+    selectors (tag, .class, #id, [attr]) joined by descendant combinators.
+    The first element matching the best alternative is passed to value.
+    With many=True the selectors name a container and item, e.g.
+    'div#product-details li': every item's value that passes keep is
+    joined with ' | ', an empty container gives '' and no container gives
+    default.
+    """
+    name: str
+    selectors: tuple
+    value: Callable = text
+    default: str = "N/A"
+    many: bool = False
+    keep: Optional[Callable] = None
+
+@dataclass(frozen=True)
+class Schema:
+    """Fields of one kind of element plus derived values computed from them"""
+    fields: tuple
+    derive: dict = field(default_factory=dict)
+
+    def compile(self):
+        return CompiledSchema(self)
+
+class _Step:
+    __slots__ = ('tag', 'css_class', 'id', 'attr')
+
+    def __init__(self, text_step):
+        match = _STEP.match(text_step)
+        if not match:
+            raise ValueError(f"Unsupported selector step '{text_step}'")
+        self.tag, self.css_class, self.id, self.attr = match.groups()
+
+    def matches(self, name, attrs):
+        if self.tag and self.tag != name:
+            return False
+        if self.css_class:
+            classes = attrs.get('class') or ()
+            if isinstance(classes, str):
+                classes = classes.split()
+            if self.css_class not in classes:
+                return False
+        if self.id and attrs.get('id') != self.id:
+            return False
+        if self.attr and attrs.get(self.attr) is None:
+            return False
+        return True
+
+class _Rule:
+    """One selector chain of a field; kind is 'first', 'item' or 'container'"""
+    __slots__ = ('field', 'priority', 'kind', 'selector', 'steps')
+
+    def __init__(self, field, priority, kind, selector):
+        self.field = field
+        self.priority = priority
+        self.kind = kind
+        self.selector = selector
+        self.steps = [_Step(step) for step in selector.split()]
+
+class CompiledSchema:
+    """A schema turned into a single traversal of the element it is applied to.
+
+    BeautifulSoup elements are walked once in Python, tracking for every
+    rule how much of its selector chain the ancestors already matched,
+    instead of one find() walk per field. selectolax already matches in C
+    and a grouped selector costs as much as its parts there, so it runs one
+    query per alternative, stopping at the first that matches.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.rules = []
+        for spec in schema.fields:
+            for priority, selector in enumerate(spec.selectors):
+                if spec.many:
+                    container = selector.rsplit(' ', 1)[0]
+                    self.rules.append(_Rule(spec, priority, 'container', container))
+                    self.rules.append(_Rule(spec, priority, 'item', selector))
+                else:
+                    self.rules.append(_Rule(spec, priority, 'first', selector))
+        self.start = [(rule, 0) for rule in self.rules]
+        self.queries = [
+            (spec, [selector.rsplit(' ', 1) if spec.many else selector for selector in spec.selectors])
+            for spec in schema.fields
+        ]
+
+    def extract(self, element):
+        """Return a dict of field name -> value for one element"""
+        found = {}
+        if isinstance(element, SelectolaxElement):
+            self._query(element, found)
+        else:
+            self._walk(element, self.start, found)
+        return self._values(found)
+
+    def _record(self, found, rule, element):
+        key = (rule.field.name, rule.priority)
+        if rule.kind == 'first':
+            found.setdefault(key, element)
+        elif rule.kind == 'container':
+            found.setdefault(key, [])
+        else:
+            items = found.setdefault(key, [])
+            # Nested containers reach the same item along several chains
+            if not items or items[-1] is not element:
+                items.append(element)
+
+    def _walk(self, element, pending, found):
+        for child in element.children:
+            if not isinstance(child, Tag):
+                continue
+            name = child.name
+            attrs = child.attrs
+            advanced = None
+            for rule, index in pending:
+                if rule.steps[index].matches(name, attrs):
+                    if index == len(rule.steps) - 1:
+                        self._record(found, rule, child)
+                    else:
+                        if advanced is None:
+                            advanced = []
+                        advanced.append((rule, index + 1))
+            if child.contents:
+                self._walk(child, pending + advanced if advanced else pending, found)
+
+    def _query(self, element, found):
+        for spec, selectors in self.queries:
+            for priority, selector in enumerate(selectors):
+                if spec.many:
+                    container, item = selector
+                    match = element.select_one(container)
+                    if match is not None:
+                        match = match.select(item)
+                else:
+                    match = element.select_one(selector)
+                if match is not None:
+                    found[(spec.name, priority)] = match
+                    break
+
+    def _values(self, found):
+        values = {}
+        for spec in self.schema.fields:
+            value = spec.default
+            for priority in range(len(spec.selectors)):
+                matched = found.get((spec.name, priority))
+                if matched is None:
+                    continue
+                if spec.many:
+                    items = [spec.value(element) for element in matched]
+                    value = ' | '.join(item for item in items if spec.keep is None or spec.keep(item))
+                else:
+                    value = spec.value(matched)
+                break
+            values[spec.name] = value
+        for name, derive in self.schema.derive.items():
+            values[name] = derive(values)
+        return values
+
+def sku_from_link(values):
+    """Return the last path segment of the product link without its extension"""
+    link = values['product_link']
+    if link == "N/A":
+        return "N/A"
+    return link.split('/')[-1].split('.')[0] or "N/A"
+
+def condition_with_completeness(values):
+    completeness = values.pop('completeness')
+    if completeness != "N/A":
+        return f"{values['condition']} | Completeness: {completeness}"
+    return values['condition']
+
+LISTING_SCHEMA = Schema(
+    fields=(
+        Field('brand', ('p.brand',)),
+        Field('name', ('p.name',)),
+        # The special price of a discounted product wins over the regular price
+        Field('price', ('div.price-box p.special-price span.price', 'div.price-box span.regular-price span.price')),
+        Field('original_price', ('div.price-box p.old-price span.price',)),
+        Field('discount', ('div.price-box p.yoursaving span.price',), default="No discount"),
+        Field('product_link', ('a[href]',), value=href),
+        Field('primary_image', ('div.images img.img-primary',), value=image_url),
+        Field('hover_image', ('div.images img.img-secondary',), value=image_url),
+    ),
+    derive={'sku': sku_from_link}
+)
+
+DETAIL_SCHEMA = Schema(
+    fields=(
+        Field('quality', ('div#product-quality',)),
+        Field('description', ('div#product-description',)),
+        Field('details', ('div#product-details li',), many=True, keep=lambda item: MEASUREMENT_NOTE not in item),
+        Field('condition', ('div#product-condition li',), many=True),
+        Field('completeness', ('div#product-completeness li',), many=True),
+    ),
+    derive={'condition': condition_with_completeness}
+)
+
+listing_extractor = LISTING_SCHEMA.compile()
+detail_extractor = DETAIL_SCHEMA.compile()
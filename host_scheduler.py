@@ -0,0 +1,216 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+# Attempts after the first one for timeouts, 429 and 5xx answers
+RETRIES = int(os.environ.get('BANANINA_RETRIES', 3))
+
+# Jittered backoff: a random wait of up to BACKOFF_BASE * 2**attempt seconds, capped
+BACKOFF_BASE = float(os.environ.get('BANANINA_BACKOFF_BASE', 0.5))
+BACKOFF_CAP = float(os.environ.get('BANANINA_BACKOFF_CAP', 30))
+
+# Answers that mean the host is overloaded or briefly broken, not that the page is missing
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Responses slower than this count as congestion and shrink the concurrency limit
+LATENCY_TARGET = float(os.environ.get('BANANINA_LATENCY_TARGET_MS', 3000)) / 1000
+
+# Longest Retry-After pause honoured, in seconds
+MAX_RETRY_AFTER = 300
+
+# Concurrency decreases closer together than this are treated as one congestion event
+DECREASE_COOLDOWN = 1.0
+
+# Requests, retries, retried requests that succeeded and give-ups across all hosts during the current run
+scheduler_stats = Counter()
+_stats_lock = threading.Lock()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+class HostLimiter:
+    """Token bucket plus AIMD concurrency limit for the requests to one host.
+
+    The bucket caps the request rate (rate=0 means uncapped). The number of
+    requests in flight may grow by one per window of on-time successes, up
+    to max_concurrency, and is halved on a 429, a 5xx or a timeout, or cut
+    by a tenth when responses get slower than LATENCY_TARGET. A Retry-After
+    header pauses the whole host for as long as it asks.
+    """
+
+    def __init__(self, host, rate=0, burst=None, max_concurrency=8, min_concurrency=1):
+        self.host = host
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max(min_concurrency, max_concurrency // 2))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def _take_token(self, now):
+        """Take a token if one is available; otherwise return how long to wait for one"""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a request to the host may start"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                    continue
+                if self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                    continue
+                wait = self._take_token(now)
+                if wait:
+                    self.condition.wait(wait)
+                    continue
+                self.in_flight += 1
+                return
+
+    def release(self, outcome, latency, retry_after=None):
+        """Finish a request; outcome is 'ok', 'failed', 'throttled', 'error' or 'timeout'"""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == 'failed':
+                # Errors a retry can't fix say nothing about the host's load
+                pass
+            elif outcome == 'ok' and latency <= LATENCY_TARGET:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif now - self.decreased_at >= DECREASE_COOLDOWN:
+                factor = 0.9 if outcome == 'ok' else 0.5
+                self.limit = max(self.min_concurrency, self.limit * factor)
+                self.decreased_at = now
+                count('decreases')
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            self.condition.notify_all()
+
+def count(kind, amount=1):
+    with _stats_lock:
+        scheduler_stats[kind] += amount
+
+def get_limiter(url, rate=0, max_concurrency=8):
+    """Return the limiter of url's host, created with these settings on first use"""
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(host, rate=rate, max_concurrency=max_concurrency)
+        return _limiters[host]
+
+def retry_after_seconds(headers):
+    """Return the wait a Retry-After header asks for, in seconds, or None"""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return min(MAX_RETRY_AFTER, float(value))
+    try:
+        return min(MAX_RETRY_AFTER, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+def backoff(attempt, retry_after=None):
+    """Return the jittered wait before retry number attempt (0-based)"""
+    wait = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(wait, retry_after or 0)
+
+def is_timeout(error):
+    """Return whether error is a timeout or dropped connection of requests or httpx"""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+def response_of(result):
+    return getattr(result, 'status_code', None), getattr(result, 'headers', None)
+
+def request(url, send, rate=0, max_concurrency=8, retries=RETRIES, label='page', status=response_of):
+    """Call send() under the limiter of url's host, retrying what a retry can fix.
+
+    send makes one attempt and returns its result; status turns that result
+    into (status code, headers). Timeouts, dropped connections, 429 and 5xx
+    answers, returned or raised as HTTP errors, are retried after a
+    jittered backoff that honours Retry-After. Returns (result, attempts);
+    after the last attempt the final result is returned or error raised.
+    """
+    limiter = get_limiter(url, rate, max_concurrency)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        started = time.monotonic()
+        result = None
+        error = None
+        try:
+            result = send()
+            code, headers = status(result)
+        except Exception as e:
+            error = e
+            response = getattr(e, 'response', None)
+            code, headers = response_of(response) if response is not None else (None, None)
+        latency = time.monotonic() - started
+
+        if error is not None and code is None:
+            outcome = 'timeout' if is_timeout(error) else 'failed'
+        elif code == 429:
+            outcome = 'throttled'
+        elif code in RETRY_STATUSES:
+            outcome = 'error'
+        else:
+            outcome = 'ok'
+        retry_after = retry_after_seconds(headers) if outcome in ('throttled', 'error') else None
+        limiter.release(outcome, latency, retry_after)
+
+        count('requests')
+        retryable = outcome in ('throttled', 'error', 'timeout')
+        if retryable:
+            count(outcome)
+        if not retryable or attempt >= retries:
+            if retryable:
+                count(f'{label}_gave_up')
+            elif attempt and error is None and (code is None or code < 400):
+                count(f'{label}_ok_after_retry')
+            if error is not None:
+                raise error
+            return result, attempt + 1
+
+        count('retries')
+        time.sleep(backoff(attempt, retry_after))
+        attempt += 1
+
+def print_scheduler_stats():
+    """Print the retry counters and the concurrency limit each host settled on"""
+    stats = scheduler_stats
+    print(f"Requests: {stats['requests']}, retries: {stats['retries']} "
+          f"({stats['throttled']} throttled, {stats['error']} server errors, {stats['timeout']} timeouts)")
+    recovered = {key[:-len('_ok_after_retry')]: value for key, value in stats.items() if key.endswith('_ok_after_retry')}
+    gave_up = {key[:-len('_gave_up')]: value for key, value in stats.items() if key.endswith('_gave_up')}
+    for label in sorted(set(recovered) | set(gave_up)):
+        print(f"- {label}: {recovered.get(label, 0)} requests succeeded after a retry, "
+              f"{gave_up.get(label, 0)} gave up")
+    with _limiters_lock:
+        for host, limiter in sorted(_limiters.items()):
+            print(f"- {host}: concurrency limit {limiter.limit:.1f} of {limiter.max_concurrency}")
@@ -0,0 +1,111 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Parser backends understood by parse_html; lxml and selectolax are optional installs
+BACKENDS = ['html.parser', 'lxml', 'selectolax']
+
+def available_backends():
+    """Return the backends whose parser library is installed"""
+    available = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        available.append('lxml')
+    except ImportError:
+        pass
+    try:
+        import selectolax.lexbor  # noqa: F401
+        available.append('selectolax')
+    except ImportError:
+        pass
+    return available
+
+def check_backend(backend):
+    """Raise ValueError if backend is unknown or its library is missing"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown parser backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend not in available_backends():
+        raise ValueError(f"Parser backend '{backend}' is not installed")
+
+def make_strainer(div_classes=None, div_ids=None):
+    """Build a SoupStrainer keeping only divs with one of the given classes or ids"""
+    if div_classes:
+        wanted = set(div_classes)
+        # The strainer sees the raw class attribute, so split it ourselves
+        return SoupStrainer('div', class_=lambda value: value is not None and not wanted.isdisjoint(value.split()))
+    if div_ids:
+        return SoupStrainer('div', id=list(div_ids))
+    return None
+
+def parse_html(content, backend='html.parser', div_classes=None, div_ids=None):
+    """Parse HTML with the chosen backend, keeping only the divs we extract from.
+
+    div_classes or div_ids limit BeautifulSoup backends to the matching div
+    subtrees. selectolax always parses the whole document, which is cheap
+    for it, and finds the same subtrees through CSS selection. Either way
+    the result supports the find/find_all/get_text/get calls the scraper
+    makes on BeautifulSoup tags.
+    """
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        return SelectolaxElement(LexborHTMLParser(content).root)
+
+    return BeautifulSoup(content, backend, parse_only=make_strainer(div_classes, div_ids))
+
+class SelectolaxElement:
+    """A selectolax node exposing the subset of the BeautifulSoup Tag API the scraper uses"""
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    @staticmethod
+    def _selector(name, class_=None, id=None, href=False):
+        names = name if isinstance(name, (list, tuple)) else [name]
+        suffix = ''
+        if class_:
+            suffix += f'.{class_}'
+        if id:
+            suffix += f'#{id}'
+        if href:
+            suffix += '[href]'
+        return ', '.join(f'{tag}{suffix}' for tag in names)
+
+    def _descendants(self, selector):
+        # Lexbor includes the node itself in its matches, BeautifulSoup doesn't
+        own = self.node.mem_id
+        return [node for node in self.node.css(selector) if node.mem_id != own]
+
+    def find_all(self, name, class_=None, id=None, href=False):
+        return [SelectolaxElement(node) for node in self._descendants(self._selector(name, class_, id, href))]
+
+    def find(self, name, class_=None, id=None, href=False):
+        return self.select_one(self._selector(name, class_, id, href))
+
+    def select(self, selector):
+        return [SelectolaxElement(node) for node in self._descendants(selector)]
+
+    def select_one(self, selector):
+        node = self.node.css_first(selector)
+        if node is not None and node.mem_id == self.node.mem_id:
+            matches = self._descendants(selector)
+            node = matches[0] if matches else None
+        return SelectolaxElement(node) if node is not None else None
+
+    def get_text(self, strip=False):
+        return self.node.text(deep=True, separator='', strip=strip)
+
+    def get(self, key, default=None):
+        attributes = self.node.attributes
+        if key not in attributes:
+            return default
+        # Valueless attributes are None in selectolax and '' in BeautifulSoup
+        value = attributes[key]
+        return '' if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def decompose(self):
+        pass  # The lexbor tree is freed with its parser
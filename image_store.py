@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+class ImageStore:
+    """Content-addressed image files with an index from image URL to content hash.
+
+    Files live at <root>/<first two hex digits>/<sha256><ext>, so identical
+    images downloaded from different URLs are stored once. The index keeps,
+    per URL without its query string, the v= token it was last fetched
+    with and the ETag and Last-Modified headers needed to revalidate it.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        (self.root / 'tmp').mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self.conn = sqlite3.connect(self.root / 'index.db', timeout=30, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                version TEXT,
+                filename TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def url_lock(self, url):
+        """Return the lock serialising work on one URL, e.g. a product whose two images are the same"""
+        with self._lock:
+            if url not in self._url_locks:
+                self._url_locks[url] = threading.Lock()
+            return self._url_locks[url]
+
+    def lookup(self, url):
+        """Return the index entry of url as a dict, or None if it was never stored"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT version, filename, etag, last_modified FROM images WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        version, filename, etag, last_modified = row
+        return {'version': version, 'filename': filename, 'etag': etag, 'last_modified': last_modified}
+
+    def record(self, url, version, filename, etag=None, last_modified=None):
+        """Point url at a stored file and remember how to revalidate it"""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT INTO images (url, version, filename, etag, last_modified) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    version = excluded.version,
+                    filename = excluded.filename,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified
+            ''', (url, version, filename, etag, last_modified))
+
+    def path(self, filename):
+        return self.root / filename
+
+    def temp_path(self):
+        """Return a fresh path for a download in progress"""
+        return self.root / 'tmp' / f"{uuid.uuid4().hex}.part"
+
+    def add_file(self, temp_path, digest, ext):
+        """Move a finished download into the store; return its filename and whether it was new"""
+        filename = f"{digest[:2]}/{digest}{ext}"
+        target = self.path(filename)
+        if target.exists():
+            os.remove(temp_path)
+            return filename, False
+        target.parent.mkdir(exist_ok=True)
+        os.replace(temp_path, target)
+        return filename, True
+
+    def disk_usage(self):
+        """Return the bytes taken by the stored image files"""
+        return sum(
+            path.stat().st_size
+            for path in self.root.glob('??/*')
+            if path.is_file()
+        )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import hashlib
+import time
+import concurrent.futures
+from collections import defaultdict
+from pathlib import Path
+
+# Widths (in pixels) of the resized copies served to the storefront grids
+VARIANT_WIDTHS = [int(width) for width in os.environ.get('BANANINA_VARIANT_WIDTHS', '320,640').split(',')]
+
+# Formats written for every width; browsers without WebP get the JPEG
+VARIANT_FORMATS = ['webp', 'jpeg']
+
+VARIANT_QUALITY = 80
+
+# Where variants and their manifest are written; by default images/variants beside the
+# downloaded images, where the storefront reads public/assets/images/variants/manifest.json
+VARIANT_DIR = os.environ.get('BANANINA_VARIANT_DIR')
+
+MANIFEST_NAME = 'manifest.json'
+
+def pillow_available():
+    """Return whether Pillow, which the variant stage needs, is installed"""
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def source_key(source_path):
+    """Return the content hash of a source image; store files are already named by it"""
+    stem = Path(source_path).stem
+    if re.fullmatch(r'[0-9a-f]{64}', stem):
+        return stem
+    with open(source_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def default_variant_dir():
+    """Return the variants folder under download_images.BASE_DIR, the storefront's assets/images"""
+    # download_images imports this module, so it can't be imported at the top
+    import download_images
+    return download_images.BASE_DIR / 'variants'
+
+def variant_path(key, width, fmt, variant_dir):
+    ext = '.webp' if fmt == 'webp' else '.jpg'
+    return Path(variant_dir) / key[:2] / f"{key}_{width}{ext}"
+
+def make_variants(source_path, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS,
+                  quality=VARIANT_QUALITY, variant_dir=None):
+    """Write the missing resized copies of one image; runs in a worker process.
+
+    Variants are named after the source's content hash, so an existing file
+    means its input is unchanged and the work is skipped. Images are never
+    upscaled: a width larger than the source gets a copy at source width.
+    """
+    from PIL import Image
+
+    variant_dir = variant_dir or VARIANT_DIR or default_variant_dir()
+    key = source_key(source_path)
+    variants = []
+    created = 0
+    image = None
+
+    for width in widths:
+        for fmt in formats:
+            path = variant_path(key, width, fmt, variant_dir)
+            if not path.exists():
+                if image is None:
+                    with Image.open(source_path) as opened:
+                        image = opened.convert('RGB')
+                resized = image.copy()
+                resized.thumbnail((width, width * 10), Image.LANCZOS)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                resized.save(temp_path, format=fmt.upper(), quality=quality)
+                os.replace(temp_path, path)
+                created += 1
+            variants.append({
+                'width': width,
+                'format': fmt,
+                'path': path.as_posix(),
+                'bytes': path.stat().st_size
+            })
+
+    return {
+        'source': Path(source_path).as_posix(),
+        'bytes': os.path.getsize(source_path),
+        'created': created,
+        'variants': variants
+    }
+
+class VariantStage:
+    """Generate image variants in a process pool while downloads are still running.
+
+    Call submit() for every downloaded image and finish() at the end, which
+    waits for the pool, merges the results into the manifest and prints
+    images/s and bytes saved per category. Bytes saved compare each source
+    with its smallest WebP variant, which is what a grid thumbnail needs.
+    Manifest paths are relative to the assets folder two levels above
+    variant_dir, as getImageVariantUrl in includes/helpers.php looks them up.
+    """
+
+    def __init__(self, workers=None, variant_dir=None):
+        self.variant_dir = Path(variant_dir or VARIANT_DIR or default_variant_dir())
+        self.assets_dir = self.variant_dir.parent.parent
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.submitted = set()
+        self.first_submit = {}
+
+    def submit(self, source_path, category):
+        """Queue one downloaded image, once per run"""
+        source_path = Path(source_path).as_posix()
+        if source_path in self.submitted:
+            return
+        self.submitted.add(source_path)
+        self.first_submit.setdefault(category, time.perf_counter())
+        future = self.executor.submit(make_variants, source_path, variant_dir=self.variant_dir)
+        self.futures[future] = category
+
+    def _asset_path(self, path):
+        """Return path relative to the assets folder, or as given when it lies elsewhere"""
+        try:
+            return Path(path).resolve().relative_to(self.assets_dir.resolve()).as_posix()
+        except ValueError:
+            return Path(path).as_posix()
+
+    def _load_manifest(self):
+        path = self.variant_dir / MANIFEST_NAME
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_manifest(self, manifest):
+        self.variant_dir.mkdir(parents=True, exist_ok=True)
+        path = self.variant_dir / MANIFEST_NAME
+        temp_path = path.with_name(f"{MANIFEST_NAME}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def finish(self):
+        """Wait for every variant, write the manifest and print per-category stats"""
+        manifest = self._load_manifest()
+        stats = defaultdict(lambda: {'images': 0, 'created': 0, 'failed': 0, 'saved': 0, 'finished': 0.0})
+
+        for future in concurrent.futures.as_completed(self.futures):
+            category = self.futures[future]
+            category_stats = stats[category]
+            category_stats['finished'] = time.perf_counter()
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error creating image variants: {str(e)}")
+                category_stats['failed'] += 1
+                continue
+
+            for variant in result['variants']:
+                variant['path'] = self._asset_path(variant['path'])
+            manifest[self._asset_path(result['source'])] = {'bytes': result['bytes'], 'variants': result['variants']}
+            smallest = min(
+                (variant['bytes'] for variant in result['variants'] if variant['format'] == 'webp'),
+                default=result['bytes']
+            )
+            category_stats['images'] += 1
+            category_stats['created'] += result['created']
+            category_stats['saved'] += max(0, result['bytes'] - smallest)
+
+        self.executor.shutdown()
+        self._save_manifest(manifest)
+
+        print("Image variants per category:")
+        for category, category_stats in sorted(stats.items()):
+            elapsed = max(category_stats['finished'] - self.first_submit[category], 1e-9)
+            print(f"- {category}: {category_stats['images']} images, {category_stats['created']} variants created, "
+                  f"{category_stats['failed']} failed, {category_stats['images'] / elapsed:.1f} images/s, "
+                  f"{category_stats['saved'] / (1024 * 1024):.2f} MB saved")
+
+def main():
+    """Build variants for every local image path listed in the *_bags.csv files"""
+    import csv
+
+    csv_files = [f for f in os.listdir('.') if f.endswith('_bags.csv')]
+    if not csv_files:
+        print("No CSV files found!")
+        return
+
+    stage = VariantStage()
+    for csv_file in csv_files:
+        category = csv_file.replace('_bags.csv', '')
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                for column in ['Primary Image Local Path', 'Hover Image Local Path']:
+                    path = (row.get(column) or '').replace('\\', '/')
+                    if path and os.path.exists(path):
+                        stage.submit(path, category)
+    stage.finish()
+
+if __name__ == "__main__":
+    main()
@@ -9,4 +9,109 @@ function getImageUrl($path) {
     // Remove leading slash if present
     $path = ltrim($path, '/');
     return '/' . $path;
-} 
\ No newline at end of file
+} 
+
+function getImageVariantUrl($path, $width = 640) {
+    // Variants and their manifest are written by image_variants.py
+    static $manifest = null;
+    if ($manifest === null) {
+        $manifestFile = __DIR__ . '/../public/assets/images/variants/manifest.json';
+        $manifest = file_exists($manifestFile) ? (json_decode(file_get_contents($manifestFile), true) ?: []) : [];
+    }
+
+    // Manifest keys are relative to the assets folder, e.g. images/store/ab/abcd.jpg
+    $key = preg_replace('#^/?assets/#', '', ltrim($path, '/'));
+    if (isset($manifest[$key])) {
+        // Smallest WebP variant at least as wide as requested, else the widest one
+        $best = null;
+        foreach ($manifest[$key]['variants'] as $variant) {
+            if ($variant['format'] !== 'webp') {
+                continue;
+            }
+            $fits = $variant['width'] >= $width;
+            $bestFits = $best !== null && $best['width'] >= $width;
+            if ($best === null
+                || ($fits && (!$bestFits || $variant['width'] < $best['width']))
+                || (!$fits && !$bestFits && $variant['width'] > $best['width'])) {
+                $best = $variant;
+            }
+        }
+        if ($best !== null) {
+            return asset($best['path']);
+        }
+    }
+
+    return str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($path));
+}
+
+function searchIndexState($conn) {
+    // The search_* tables are written by search_index.py; null until it has run, and search falls back to LIKE
+    static $state = false;
+    if ($state === false) {
+        $state = null;
+        try {
+            $result = $conn->query("SELECT built_at FROM search_builds LIMIT 1");
+            $builtAt = $result ? $result->fetchColumn() : false;
+            if ($builtAt !== false) {
+                // Products written since the build are missing from the index or indexed with their old text
+                $changedStmt = $conn->prepare("SELECT 1 FROM products WHERE updated_at >= :built_at LIMIT 1");
+                $changedStmt->execute([':built_at' => $builtAt]);
+                $state = ['built_at' => $builtAt, 'changed' => $changedStmt->fetchColumn() !== false];
+            }
+        } catch (PDOException $e) {
+            $state = null;
+        }
+    }
+    return $state;
+}
+
+function searchCondition($conn, $search, &$params) {
+    // The same condition as search_index.search_condition
+    $index = searchIndexState($conn);
+    if ($index === null) {
+        $params[':search'] = "%$search%";
+        return " AND (p.name LIKE :search OR p.description LIKE :search OR b.name LIKE :search)";
+    }
+
+    // Every word must start one of the product's indexed terms, the suffixes of its words; a search without words finds nothing
+    preg_match_all('/[\p{L}\p{N}]+/u', mb_strtolower($search), $matches);
+    $words = array_values(array_unique(array_map(function($word) { return mb_substr($word, 0, 64); }, $matches[0])));
+    $conditions = [];
+    foreach ($words as $i => $word) {
+        $conditions[] = "p.id IN (SELECT sp.product_id FROM search_postings sp
+                         JOIN search_terms st ON st.id = sp.term_id
+                         WHERE st.term >= :term_from_$i AND st.term < :term_to_$i)";
+        $params[":term_from_$i"] = $word;
+        // The smallest string above every term starting with the word
+        $params[":term_to_$i"] = mb_substr($word, 0, -1) . mb_chr(mb_ord(mb_substr($word, -1)) + 1);
+    }
+    $indexed = $conditions ? implode(' AND ', $conditions) : '1 = 0';
+    if (!$index['changed']) {
+        return " AND $indexed";
+    }
+
+    // Products changed since the build are matched with LIKE, found through idx_updated
+    $params[':index_built_at'] = $index['built_at'];
+    $params[':search'] = "%$search%";
+    return " AND ((p.updated_at < :index_built_at AND $indexed)
+             OR p.id IN (SELECT cp.id FROM products cp LEFT JOIN brands cb ON cb.id = cp.brand_id
+                         WHERE cp.updated_at >= :index_built_at
+                         AND (cp.name LIKE :search OR cp.description LIKE :search OR cb.name LIKE :search)))";
+}
+
+function searchFacetCounts($conn) {
+    // Product counts per facet value, e.g. ['brand' => ['3' => 42]], as of the last index build
+    $counts = [];
+    if (searchIndexState($conn) === null) {
+        return $counts;
+    }
+    try {
+        $result = $conn->query("SELECT facet, value, products FROM search_facets");
+        foreach ($result ? $result->fetchAll(PDO::FETCH_ASSOC) : [] as $row) {
+            $counts[$row['facet']][$row['value']] = (int)$row['products'];
+        }
+    } catch (PDOException $e) {
+        // Counts are decoration; the filters work without them
+    }
+    return $counts;
+}
@@ -0,0 +1,227 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Collect stage timings and counters; off by default so the hooks cost next to nothing
+ENABLED = os.environ.get('BANANINA_METRICS', '0') != '0'
+
+# Where <run>.jsonl event logs, <run>.prom dumps and <category>.pstats profiles go
+METRICS_DIR = Path(os.environ.get('BANANINA_METRICS_DIR', 'metrics'))
+
+# Category whose run is profiled with cProfile, if any
+PROFILE_CATEGORY = os.environ.get('BANANINA_PROFILE_CATEGORY') or None
+
+# Category the current task or thread works on; asyncio.to_thread carries it along
+_category = contextvars.ContextVar('category', default='')
+_profile_session = contextvars.ContextVar('profile_session', default=None)
+
+_lock = threading.Lock()
+_stages = defaultdict(lambda: [0, 0.0, 0.0])
+_counters = defaultdict(float)
+_run_name = None
+_event_log = None
+
+_null_timer = contextlib.nullcontext()
+
+class _Timer:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+def configure(enabled=None, profile_category=None):
+    """Override the environment settings, e.g. from command line flags"""
+    global ENABLED, PROFILE_CATEGORY
+    if enabled is not None:
+        ENABLED = enabled
+    if profile_category is not None:
+        PROFILE_CATEGORY = profile_category
+
+def start(run_name):
+    """Reset the collected metrics and open <run_name>.jsonl for this run's events"""
+    global _run_name, _event_log
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _run_name = run_name
+        if ENABLED:
+            METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            _event_log = open(METRICS_DIR / f"{run_name}.jsonl", 'w', encoding='utf-8')
+
+def timer(stage):
+    """Return a context manager timing one pass through stage for the current category"""
+    if not ENABLED:
+        return _null_timer
+    return _Timer(stage)
+
+def observe(stage, seconds):
+    """Record that stage took seconds for the current category"""
+    if not ENABLED:
+        return
+    category = _category.get()
+    with _lock:
+        entry = _stages[(stage, category)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        if _event_log:
+            _event_log.write(json.dumps({
+                'ts': round(time.time(), 6),
+                'stage': stage,
+                'category': category,
+                'seconds': round(seconds, 6)
+            }) + '\n')
+
+def count(name, amount=1):
+    """Add amount to the counter name of the current category"""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[(name, _category.get())] += amount
+
+@contextlib.contextmanager
+def scope(category):
+    """Attribute the metrics recorded inside the block to category"""
+    token = _category.set(category)
+    try:
+        yield
+    finally:
+        _category.reset(token)
+
+class _ProfileSession:
+    """The cProfile profiles of one category, one per thread that worked on it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = []
+
+    def enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active (Python 3.12+ allows one at a time)
+            return None
+        with self.lock:
+            self.profiles.append(profile)
+        return profile
+
+async def run_category(coro, category):
+    """Await a category's coroutine with its metrics label set, profiling it if asked.
+
+    The profile covers the event loop thread while the category runs and the
+    worker threads started through call(). Other categories sharing the loop
+    at the same time show up in it too, so profile a category run on its own.
+    """
+    with scope(category):
+        if category != PROFILE_CATEGORY:
+            return await coro
+
+        session = _ProfileSession()
+        token = _profile_session.set(session)
+        profile = session.enable()
+        try:
+            return await coro
+        finally:
+            if profile:
+                profile.disable()
+            _profile_session.reset(token)
+            _dump_profile(session, category)
+
+def call(func, *args):
+    """Call func, profiled when it runs for the profiled category; use inside asyncio.to_thread"""
+    session = _profile_session.get()
+    if session is None:
+        return func(*args)
+    profile = session.enable()
+    try:
+        return func(*args)
+    finally:
+        if profile:
+            profile.disable()
+
+def _dump_profile(session, category):
+    if not session.profiles:
+        return
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    stats = pstats.Stats(*session.profiles)
+    path = METRICS_DIR / f"{category}.pstats"
+    stats.dump_stats(path)
+    print(f"\nProfile of {category} written to {path}, top functions by cumulative time:")
+    stats.sort_stats('cumulative').print_stats(15)
+
+def _labels(stage_or_name, category, key='stage'):
+    label = f'{key}="{stage_or_name}"'
+    if category:
+        label += f',category="{category}"'
+    return '{' + label + '}'
+
+def prometheus_text():
+    """Return the collected metrics in the Prometheus text exposition format"""
+    with _lock:
+        stages = sorted(_stages.items())
+        counters = sorted(_counters.items())
+
+    lines = [
+        '# HELP bananina_stage_seconds_total Time spent in each stage.',
+        '# TYPE bananina_stage_seconds_total counter'
+    ]
+    lines += [f"bananina_stage_seconds_total{_labels(stage, category)} {entry[1]:.6f}"
+              for (stage, category), entry in stages]
+    lines += [
+        '# HELP bananina_stage_calls_total Passes through each stage.',
+        '# TYPE bananina_stage_calls_total counter'
+    ]
+    lines += [f"bananina_stage_calls_total{_labels(stage, category)} {entry[0]}"
+              for (stage, category), entry in stages]
+    lines += [
+        '# HELP bananina_stage_seconds_max Longest single pass through each stage.',
+        '# TYPE bananina_stage_seconds_max gauge'
+    ]
+    lines += [f"bananina_stage_seconds_max{_labels(stage, category)} {entry[2]:.6f}"
+              for (stage, category), entry in stages]
+    lines += [
+        '# HELP bananina_events_total Counted events such as pages, rows and bytes.',
+        '# TYPE bananina_events_total counter'
+    ]
+    lines += [f"bananina_events_total{_labels(name, category, 'event')} {value:g}"
+              for (name, category), value in counters]
+    return '\n'.join(lines) + '\n'
+
+def finish():
+    """Write <run>.prom, close the event log and print the slowest stages"""
+    global _event_log
+    if not ENABLED or _run_name is None:
+        return
+    with _lock:
+        if _event_log:
+            _event_log.close()
+            _event_log = None
+        totals = defaultdict(float)
+        for (stage, _), entry in _stages.items():
+            totals[stage] += entry[1]
+
+    path = METRICS_DIR / f"{_run_name}.prom"
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text(prometheus_text(), encoding='utf-8')
+    os.replace(temp_path, path)
+
+    print(f"Metrics written to {path} and {METRICS_DIR / f'{_run_name}.jsonl'}")
+    print("Time per stage (summed over concurrent work):")
+    for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"- {stage}: {seconds:.2f}s")
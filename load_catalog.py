@@ -0,0 +1,331 @@
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+# Products written per transaction
+BATCH_SIZE = 500
+
+# Stock given to newly imported products, as in the PHP importer
+DEFAULT_STOCK = 10
+
+# CSV columns a row must have to be imported, as in the PHP importer
+REQUIRED_FIELDS = [
+    'Brand', 'Name', 'Price', 'SKU', 'Description', 'Details', 'Condition',
+    'Primary Image Local Path', 'Hover Image Local Path'
+]
+
+# The four catalog tables of database_schema.sql, for loading into SQLite
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(50) NOT NULL,
+    slug VARCHAR(50) UNIQUE NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS brands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    slug VARCHAR(100) UNIQUE NOT NULL,
+    logo_url VARCHAR(255),
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id INT REFERENCES categories(id),
+    brand_id INT REFERENCES brands(id),
+    name VARCHAR(100) NOT NULL,
+    slug VARCHAR(100) UNIQUE NOT NULL,
+    description TEXT,
+    details TEXT,
+    meta_title VARCHAR(100),
+    meta_description VARCHAR(255),
+    price DECIMAL(10,2) NOT NULL,
+    sale_price DECIMAL(10,2),
+    stock INT NOT NULL DEFAULT 0,
+    sku VARCHAR(100) UNIQUE,
+    condition_status VARCHAR(50) DEFAULT 'New With Tag',
+    is_active BOOLEAN DEFAULT TRUE,
+    deleted_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- MySQL's ON UPDATE CURRENT_TIMESTAMP; the search index relies on updated_at to spot changed products
+CREATE TRIGGER IF NOT EXISTS products_updated_at AFTER UPDATE ON products
+WHEN NEW.updated_at IS OLD.updated_at AND (
+    NEW.category_id IS NOT OLD.category_id OR NEW.brand_id IS NOT OLD.brand_id
+    OR NEW.name IS NOT OLD.name OR NEW.description IS NOT OLD.description OR NEW.details IS NOT OLD.details
+    OR NEW.price IS NOT OLD.price OR NEW.sku IS NOT OLD.sku OR NEW.condition_status IS NOT OLD.condition_status
+    OR NEW.is_active IS NOT OLD.is_active
+)
+BEGIN
+    UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+CREATE INDEX IF NOT EXISTS idx_updated ON products (updated_at);
+CREATE TABLE IF NOT EXISTS product_galleries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INT NOT NULL REFERENCES products(id),
+    image_url VARCHAR(255) NOT NULL,
+    is_primary BOOLEAN DEFAULT FALSE,
+    sort_order INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_product_gallery ON product_galleries (product_id, is_primary);
+'''
+
+PRODUCT_COLUMNS = [
+    'category_id', 'brand_id', 'name', 'slug', 'description', 'details',
+    'meta_title', 'meta_description', 'price', 'stock', 'sku', 'condition_status', 'is_active'
+]
+
+# Columns refreshed when a product is loaded again; stock is left to the shop and the SKU
+# stays with the row that owns it
+PRODUCT_UPDATE_COLUMNS = [
+    'category_id', 'brand_id', 'name', 'description', 'details',
+    'meta_title', 'meta_description', 'price', 'condition_status'
+]
+
+class Dialect:
+    """Placeholder and upsert syntax of one database driver"""
+
+    def __init__(self, name, placeholder):
+        self.name = name
+        self.placeholder = placeholder
+
+    def placeholders(self, count):
+        return ', '.join([self.placeholder] * count)
+
+    def upsert(self, table, columns, key, update_columns):
+        """Return an INSERT that updates update_columns when key already exists"""
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({self.placeholders(len(columns))})"
+        if self.name == 'mysql':
+            updates = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+            return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+        updates = ', '.join(f"{column} = excluded.{column}" for column in update_columns)
+        return f"{sql} ON CONFLICT ({key}) DO UPDATE SET {updates}"
+
+def connect_sqlite(path):
+    """Open (and create the catalog tables in) a SQLite database"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.commit()
+    return conn, Dialect('sqlite', '?')
+
+def connect_mysql(host, user, password, database, port=3306):
+    """Open a MySQL connection; needs the optional pymysql package"""
+    import pymysql
+    conn = pymysql.connect(host=host, user=user, password=password, database=database,
+                           port=port, charset='utf8mb4', autocommit=False)
+    return conn, Dialect('mysql', '%s')
+
+def slugify(text):
+    """Lowercase text with spaces turned into dashes, like the PHP importer"""
+    return text.lower().replace(' ', '-')
+
+def clean_price(price):
+    """Turn 'IDR 3.500.000' into 3500000"""
+    digits = price.replace('IDR', '').replace(',', '').replace('.', '').replace(' ', '')
+    return int(digits) if digits.isdigit() else 0
+
+def condition_status(condition):
+    """Return the condition words of a Condition value, without the completeness items the scraper appends"""
+    return re.sub(r'\s*\|?\s*Completeness:.*$', '', condition).strip()
+
+def image_url(local_path, category):
+    """Map a CSV image path to the URL the storefront serves it from"""
+    path = local_path.replace('\\', '/')
+    if path.startswith('images/store/'):
+        return f"/assets/{path}"
+    return f"/assets/images/{category}/" + path.replace(f"images/{category}/", '', 1)
+
+def read_catalog(data_dir=DATA_DIR):
+    """Return (category, row) pairs for every row of every *_bags.csv"""
+    rows = []
+    for csv_file in sorted(Path(data_dir).glob('*_bags.csv')):
+        category = csv_file.name.replace('_bags.csv', '')
+        with open(csv_file, newline='', encoding='utf-8') as file:
+            rows.extend((category, row) for row in csv.DictReader(file))
+    return rows
+
+def prepare_products(rows, seen=None):
+    """Validate rows and drop repeated slugs and SKUs; the first occurrence wins.
+
+    seen is a (slugs, SKUs) pair of sets carried over from earlier calls,
+    for callers loading a catalog batch by batch.
+    """
+    products = []
+    skipped = 0
+    seen_slugs, seen_skus = seen if seen is not None else (set(), set())
+    for category, row in rows:
+        missing = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+        slug = slugify(row['Name'])
+        if missing or slug in seen_slugs or row['SKU'] in seen_skus:
+            skipped += 1
+            continue
+        seen_slugs.add(slug)
+        seen_skus.add(row['SKU'])
+        products.append((category, slug, row))
+    return products, skipped
+
+def upsert_lookup(conn, dialect, table, values):
+    """Upsert (name, slug) pairs into categories or brands and return a slug -> id dict"""
+    cursor = conn.cursor()
+    cursor.executemany(dialect.upsert(table, ['name', 'slug'], 'slug', ['name']), values)
+    conn.commit()
+    cursor.execute(f"SELECT id, slug FROM {table}")
+    return {slug: row_id for row_id, slug in cursor.fetchall()}
+
+def load_catalog(conn, dialect, rows, batch_size=BATCH_SIZE, seen=None):
+    """Load rows into the catalog tables and return a dict of counts and timings"""
+    timings = {}
+    started = time.perf_counter()
+    products, skipped = prepare_products(rows, seen)
+    timings['prepare'] = time.perf_counter() - started
+
+    # Categories and brands are few, so they are loaded first and kept in memory
+    started = time.perf_counter()
+    category_ids = upsert_lookup(
+        conn, dialect, 'categories',
+        sorted({(category.capitalize(), category) for category, _, _ in products})
+    )
+    brand_ids = upsert_lookup(
+        conn, dialect, 'brands',
+        sorted({(row['Brand'], slugify(row['Brand'])) for _, _, row in products})
+    )
+    timings['lookups'] = time.perf_counter() - started
+
+    product_sql = dialect.upsert('products', PRODUCT_COLUMNS, 'slug', PRODUCT_UPDATE_COLUMNS)
+    gallery_sql = (
+        f"INSERT INTO product_galleries (product_id, image_url, is_primary, sort_order) "
+        f"VALUES ({dialect.placeholders(4)})"
+    )
+
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    loaded = 0
+    sku_conflicts = 0
+    for offset in range(0, len(products), batch_size):
+        batch = products[offset:offset + batch_size]
+
+        # A SKU another product already owns would break UNIQUE(sku) and roll the batch back
+        skus = [row['SKU'] for _, _, row in batch]
+        cursor.execute(
+            f"SELECT sku, slug FROM products WHERE sku IN ({dialect.placeholders(len(skus))})", skus
+        )
+        owners = dict(cursor.fetchall())
+        kept = []
+        for category, slug, row in batch:
+            owner = owners.get(row['SKU'], slug)
+            if owner != slug:
+                print(f"Skipping {slug}: SKU {row['SKU']} belongs to {owner}")
+                sku_conflicts += 1
+                continue
+            kept.append((category, slug, row))
+        batch = kept
+        if not batch:
+            continue
+
+        product_values = []
+        for category, slug, row in batch:
+            brand = row['Brand']
+            meta_title = f"{row['Name']} | {brand} {category.capitalize()}"
+            meta_description = f"Shop {brand} {row['Name']}. {row['Description']}"
+            product_values.append((
+                category_ids[category], brand_ids[slugify(brand)], row['Name'], slug,
+                row['Description'], row['Details'], meta_title[:100], meta_description[:255],
+                clean_price(row['Price']), DEFAULT_STOCK, row['SKU'], condition_status(row['Condition']), 1
+            ))
+
+        try:
+            cursor.executemany(product_sql, product_values)
+
+            # Resolve the ids of the whole batch with one query
+            slugs = [slug for _, slug, _ in batch]
+            cursor.execute(
+                f"SELECT id, slug FROM products WHERE slug IN ({dialect.placeholders(len(slugs))})", slugs
+            )
+            product_ids = {slug: row_id for row_id, slug in cursor.fetchall()}
+
+            # Galleries have no natural key, so a reloaded product gets its images replaced
+            ids = list(product_ids.values())
+            cursor.execute(
+                f"DELETE FROM product_galleries WHERE product_id IN ({dialect.placeholders(len(ids))})", ids
+            )
+            gallery_values = []
+            for category, slug, row in batch:
+                product_id = product_ids[slug]
+                gallery_values.append((product_id, image_url(row['Primary Image Local Path'], category), 1, 0))
+                gallery_values.append((product_id, image_url(row['Hover Image Local Path'], category), 0, 1))
+            cursor.executemany(gallery_sql, gallery_values)
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        loaded += len(batch)
+    timings['products'] = time.perf_counter() - started
+
+    return {
+        'rows': len(rows),
+        'loaded': loaded,
+        'skipped': skipped + sku_conflicts,
+        'sku_conflicts': sku_conflicts,
+        'categories': len(category_ids),
+        'brands': len(brand_ids),
+        'timings': timings
+    }
+
+def add_database_arguments(parser):
+    """Add the --sqlite and --mysql-* options read by connect_from_args"""
+    parser.add_argument('--sqlite', help="path of a SQLite database to load into")
+    parser.add_argument('--mysql-host')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default=os.environ.get('MYSQL_PASSWORD', ''))
+    parser.add_argument('--mysql-db', default='bananina')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+def connect_from_args(args):
+    """Open MySQL when --mysql-host is given, otherwise SQLite (catalog.db by default)"""
+    if args.mysql_host:
+        return connect_mysql(args.mysql_host, args.mysql_user, args.mysql_password,
+                             args.mysql_db, args.mysql_port)
+    return connect_sqlite(args.sqlite or 'catalog.db')
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load data/*_bags.csv into the shop database")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    add_database_arguments(parser)
+    args = parser.parse_args()
+
+    conn, dialect = connect_from_args(args)
+
+    start_time = time.perf_counter()
+    try:
+        rows = read_catalog(args.data_dir)
+        read_time = time.perf_counter() - start_time
+        result = load_catalog(conn, dialect, rows, args.batch_size)
+    finally:
+        conn.close()
+    duration = time.perf_counter() - start_time
+
+    print(f"\n{'='*50}")
+    print(f"Loaded {result['loaded']} of {result['rows']} rows into {dialect.name} in {duration:.2f} seconds")
+    print(f"Skipped: {result['skipped']} rows (missing fields or duplicate slug/SKU), "
+          f"{result['sku_conflicts']} of them with a SKU another product owns")
+    print(f"Categories: {result['categories']}, brands: {result['brands']}")
+    print(f"Read CSVs: {read_time:.3f}s, " + ', '.join(
+        f"{stage}: {seconds:.3f}s" for stage, seconds in result['timings'].items()
+    ))
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+DATA_DIR = Path(os.environ.get('BANANINA_DATA_DIR', 'data'))
+
+# Where the typed dataset is written, one category=<name> directory per category
+DATASET_DIR = Path(os.environ.get('BANANINA_DATASET_DIR', 'catalog.parquet'))
+
+# Values the scraper writes when a field could not be read
+MISSING_VALUES = ['', 'N/A']
+
+def pyarrow_available():
+    """Return whether pyarrow, which the Parquet dataset needs, is installed"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def dataset_schema():
+    """Return the Arrow schema of the normalized catalog"""
+    import pyarrow as pa
+
+    text_list = pa.list_(pa.string())
+    return pa.schema([
+        ('category', pa.string()),
+        ('brand', pa.string()),
+        ('name', pa.string()),
+        ('sku', pa.string()),
+        ('price', pa.int64()),
+        ('original_price', pa.int64()),
+        ('discount_pct', pa.float64()),
+        ('product_link', pa.string()),
+        ('primary_image', pa.string()),
+        ('hover_image', pa.string()),
+        ('primary_image_path', pa.string()),
+        ('hover_image_path', pa.string()),
+        ('quality', pa.string()),
+        ('description', pa.string()),
+        ('details', text_list),
+        ('condition', text_list),
+        ('completeness', text_list),
+    ])
+
+def read_csvs(data_dir=DATA_DIR):
+    """Read every *_bags.csv as strings into one frame with a category column"""
+    frames = []
+    for csv_file in sorted(Path(data_dir).glob('*_bags.csv')):
+        df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+        df.insert(0, 'category', csv_file.name.replace('_bags.csv', ''))
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def to_idr(prices):
+    """Turn 'IDR 3.500.000' strings into nullable integers"""
+    digits = prices.str.replace(r'\D', '', regex=True)
+    return pd.to_numeric(digits.mask(digits == ''), errors='coerce').astype('Int64')
+
+def to_list(values, separator=r'\s*\|\s*'):
+    """Split joined strings into lists, with [] for missing values"""
+    split = values.mask(values.isin(MISSING_VALUES), '').str.strip().str.split(separator, regex=True)
+    return split.map(lambda items: [item for item in items if item])
+
+def text_or_none(values):
+    return values.mask(values.isin(MISSING_VALUES), None)
+
+def normalize(df):
+    """Return the typed catalog for a frame of raw CSV rows.
+
+    Prices become integer IDR and the discount a percentage ('No discount'
+    is 0). The Condition blob is split into its condition words and the
+    items after 'Completeness:', both title-cased so 'Care card' and
+    'Care Card' are one value.
+    """
+    discount = df['Discount'].str.extract(r'(\d+(?:\.\d+)?)\s*%', expand=False)
+    discount = pd.to_numeric(discount).mask(df['Discount'] == 'No discount', 0.0)
+
+    completeness = df['Condition'].str.extract(r'Completeness:\s*(.*)$', expand=False).fillna('').str.title()
+    condition = df['Condition'].str.replace(r'\s*\|?\s*Completeness:.*$', '', regex=True).str.title()
+    condition = condition.str.replace(r'\s+', ' ', regex=True)
+
+    return pd.DataFrame({
+        'category': df['category'],
+        'brand': text_or_none(df['Brand']),
+        'name': text_or_none(df['Name']),
+        'sku': text_or_none(df['SKU']),
+        'price': to_idr(df['Price']),
+        'original_price': to_idr(df['Original Price']),
+        'discount_pct': discount,
+        'product_link': text_or_none(df['Product Link']),
+        'primary_image': text_or_none(df['Primary Image']),
+        'hover_image': text_or_none(df['Hover Image']),
+        'primary_image_path': text_or_none(df['Primary Image Local Path'].str.replace('\\', '/', regex=False)),
+        'hover_image_path': text_or_none(df['Hover Image Local Path'].str.replace('\\', '/', regex=False)),
+        'quality': text_or_none(df['Quality']),
+        'description': text_or_none(df['Description']),
+        'details': to_list(df['Details']),
+        'condition': to_list(condition),
+        'completeness': to_list(completeness),
+    })
+
+def write_dataset(catalog, dataset_dir=DATASET_DIR):
+    """Write the catalog as Parquet partitioned by category, replacing the categories it contains"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(catalog, schema=dataset_schema(), preserve_index=False)
+    ds.write_dataset(
+        table, dataset_dir, format='parquet',
+        partitioning=['category'], partitioning_flavor='hive',
+        existing_data_behavior='delete_matching'
+    )
+
+def read_dataset(dataset_dir=DATASET_DIR, categories=None):
+    """Load the typed catalog, optionally only some categories, as a DataFrame"""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    row_filter = ds.field('category').isin(categories) if categories else None
+    return dataset.to_table(filter=row_filter).to_pandas()
+
+def main():
+    parser = argparse.ArgumentParser(description="Write data/*_bags.csv as a typed Parquet dataset")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--output', default=str(DATASET_DIR))
+    args = parser.parse_args()
+
+    if not pyarrow_available():
+        print("pyarrow is not installed; install it to write the Parquet dataset")
+        return
+
+    start_time = time.perf_counter()
+    catalog = normalize(read_csvs(args.data_dir))
+    normalize_time = time.perf_counter() - start_time
+    write_dataset(catalog, args.output)
+    write_time = time.perf_counter() - start_time - normalize_time
+
+    start_time = time.perf_counter()
+    read_dataset(args.output)
+    read_time = time.perf_counter() - start_time
+
+    print(f"\n{'='*50}")
+    print(f"Wrote {len(catalog)} rows in {catalog['category'].nunique()} categories to {args.output}")
+    print(f"Normalize: {normalize_time:.3f}s, write: {write_time:.3f}s, read back: {read_time:.3f}s")
+    print(f"Rows without a price: {catalog['price'].isna().sum()}, "
+          f"discounted: {(catalog['discount_pct'] > 0).sum()}")
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
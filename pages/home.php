@@ -241,12 +241,12 @@ $categories = $categoryStmt->fetchAll(PDO::FETCH_ASSOC);
                 <div class="w-full md:w-1/3 flex-shrink-0 px-3">
                     <div class="bg-white rounded-lg overflow-hidden group">
                         <div class="relative aspect-[3/4]">
-                            <img src="<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['primary_image'])) ?>" 
-                                 data-hover-src="<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['hover_image'])) ?>"
+                            <img src="<?= getImageVariantUrl($product['primary_image']) ?>" 
+                                 data-hover-src="<?= getImageVariantUrl($product['hover_image']) ?>"
                                  alt="<?= htmlspecialchars($product['name']) ?>"
                                  class="w-full h-full object-cover transition-opacity duration-300"
                                  onmouseover="this.src=this.dataset.hoverSrc"
-                                 onmouseout="this.src='<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['primary_image'])) ?>'"
+                                 onmouseout="this.src='<?= getImageVariantUrl($product['primary_image']) ?>'"
                                  onerror="this.src='<?= str_replace(['.jpg', '.jpeg'], '.webp', asset('images/placeholder.jpg')) ?>'">
                             <div class="absolute bottom-4 right-4">
                                 <button class="w-10 h-10 bg-white rounded-full shadow-lg flex items-center justify-center hover:bg-gray-100">
@@ -78,8 +78,8 @@ if (!empty($condition)) {
 }
 
 if ($search) {
-    $query .= " AND (p.name LIKE :search OR p.description LIKE :search OR b.name LIKE :search)";
-    $params[':search'] = "%$search%";
+    $searchCondition = searchCondition($conn, $search, $params);
+    $query .= $searchCondition;
 }
 
 // Add sorting
@@ -118,7 +118,7 @@ if (!empty($condition)) {
 }
 
 if ($search) {
-    $countQuery .= " AND (p.name LIKE :search OR p.description LIKE :search OR b.name LIKE :search)";
+    $countQuery .= $searchCondition;
 }
 
 $countStmt = $conn->prepare($countQuery);
@@ -153,6 +153,9 @@ $brandsQuery = "SELECT id, name, slug FROM brands ORDER BY name";
 $brandsStmt = $conn->prepare($brandsQuery);
 $brandsStmt->execute();
 $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
+
+// Catalog-wide product counts shown next to each filter
+$facetCounts = searchFacetCounts($conn);
 ?>
 
 <!DOCTYPE html>
@@ -235,6 +238,9 @@ $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
                                                class="h-4 w-4 rounded border-gray-300 text-blue-600">
                                         <span class="ml-2 text-sm text-gray-600"><?= htmlspecialchars($cat['name']) ?></span>
                                     </label>
+                                    <?php if (isset($facetCounts['category'][$cat['id']])): ?>
+                                    <span class="text-xs text-gray-400"><?= $facetCounts['category'][$cat['id']] ?></span>
+                                    <?php endif; ?>
                                 </div>
                                 <?php endforeach; ?>
                             </div>
@@ -265,7 +271,7 @@ $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
                                 ];
                                 foreach ($price_ranges as $range => $label):
                                 ?>
-                                <div class="flex items-center">
+                                <div class="flex items-center justify-between">
                                     <label class="flex items-center">
                                         <input type="checkbox" 
                                                name="price_range[]" 
@@ -274,6 +280,9 @@ $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
                                                class="h-4 w-4 rounded border-gray-300 text-blue-600">
                                         <span class="ml-2 text-sm text-gray-600"><?= $label ?></span>
                                     </label>
+                                    <?php if (isset($facetCounts['price'][$range])): ?>
+                                    <span class="text-xs text-gray-400"><?= $facetCounts['price'][$range] ?></span>
+                                    <?php endif; ?>
                                 </div>
                                 <?php endforeach; ?>
                             </div>
@@ -304,6 +313,9 @@ $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
                                                class="h-4 w-4 rounded border-gray-300 text-blue-600">
                                         <span class="ml-2 text-sm text-gray-600"><?= htmlspecialchars($brand['name']) ?></span>
                                     </label>
+                                    <?php if (isset($facetCounts['brand'][$brand['id']])): ?>
+                                    <span class="text-xs text-gray-400"><?= $facetCounts['brand'][$brand['id']] ?></span>
+                                    <?php endif; ?>
                                 </div>
                                 <?php endforeach; ?>
                             </div>
@@ -400,12 +412,12 @@ $brands = $brandsStmt->fetchAll(PDO::FETCH_ASSOC);
                     <div class="group relative flex flex-col h-full">
                         <div class="relative aspect-[3/4] mb-4 bg-gray-100">
                             <a href="/products/<?= htmlspecialchars($product['slug']) ?>" class="block w-full h-full">
-                                <img src="<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['primary_image'])) ?>"
-                                     data-hover-src="<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['hover_image'])) ?>"
+                                <img src="<?= getImageVariantUrl($product['primary_image']) ?>"
+                                     data-hover-src="<?= getImageVariantUrl($product['hover_image']) ?>"
                                      alt="<?= htmlspecialchars($product['name']) ?>"
                                      class="w-full h-full object-cover transition-opacity duration-300"
                                      onmouseover="this.src=this.dataset.hoverSrc"
-                                     onmouseout="this.src='<?= str_replace(['.jpg', '.jpeg'], '.webp', getImageUrl($product['primary_image'])) ?>'"
+                                     onmouseout="this.src='<?= getImageVariantUrl($product['primary_image']) ?>'"
                                      onerror="this.src='<?= str_replace(['.jpg', '.jpeg'], '.webp', asset('images/placeholder.jpg')) ?>'">
                             </a>
                         </div>
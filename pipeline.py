@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import csv
+import os
+import queue
+import threading
+import time
+
+import bananina
+import download_images
+import load_catalog
+import search_index
+from host_scheduler import print_scheduler_stats
+from image_variants import VariantStage, pillow_available
+
+# Rows waiting for an image worker, and rows with images waiting for the sink.
+# Full queues hold the stage before them back, so memory stays bounded.
+IMAGE_QUEUE_SIZE = int(os.environ.get('BANANINA_IMAGE_QUEUE_SIZE', 64))
+SINK_QUEUE_SIZE = int(os.environ.get('BANANINA_SINK_QUEUE_SIZE', 256))
+
+# Threads downloading the images of scraped rows
+IMAGE_WORKERS = download_images.MAX_WORKERS
+
+# How long a detail worker waits before offering a row to a full image queue again
+BACKPRESSURE_POLL = 0.05
+
+# Rows loaded into the database per transaction; a partial batch is loaded when the sink goes idle
+LOAD_BATCH_SIZE = load_catalog.BATCH_SIZE
+LOAD_IDLE_SECONDS = 1.0
+
+# Columns of the CSVs the pipeline writes: the scraper's plus those download_images.py adds
+OUTPUT_HEADER = bananina.CSV_HEADER + ['Primary Image Local Path', 'Hover Image Local Path']
+
+class _CategoryFile:
+    """The CSV of one category, written in listing order as rows come back from the image stage"""
+
+    def __init__(self, category):
+        self.filename = f"{category}_bags.csv"
+        self.temp_filename = f"{self.filename}.pipeline.tmp"
+        self.file = open(self.temp_filename, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(OUTPUT_HEADER)
+        self.written = 0
+        self.waiting = {}
+        self.expected = None
+
+    def add(self, position, row):
+        # Rows overtake each other in the image stage; hold the early ones until their turn
+        self.waiting[position] = row
+        while self.written in self.waiting:
+            self.writer.writerow(self.waiting.pop(self.written))
+            self.written += 1
+
+    def complete(self):
+        return self.expected is not None and self.written >= self.expected
+
+    def close(self, keep):
+        self.file.close()
+        if keep:
+            os.replace(self.temp_filename, self.filename)
+        else:
+            os.remove(self.temp_filename)
+
+class Pipeline:
+    """Image and sink stages fed by the scraper while it runs.
+
+    The scraper awaits put_row for every row it writes; the row goes
+    through a bounded queue to IMAGE_WORKERS threads that download its
+    images, then through another bounded queue to a single sink thread.
+    The sink writes each category's CSV with the local image paths and
+    loads the rows into the database in batches, rebuilding the search
+    index once the last batch is in. category_done tells the
+    sink how many rows a category has, so its CSV is replaced once all of
+    them are through.
+    """
+
+    def __init__(self, connect, variants=None):
+        self.connect = connect
+        self.variants = variants
+        self.images = queue.Queue(maxsize=IMAGE_QUEUE_SIZE)
+        self.sink = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+        self.stats = {'rows': 0, 'stalls': 0, 'loaded': 0, 'skipped': 0, 'load_failed': 0,
+                      'files': 0, 'indexed': 0, 'image_seconds': 0.0, 'sink_seconds': 0.0}
+        self.stats_lock = threading.Lock()
+        self.unfinished = []
+        self.image_threads = [
+            threading.Thread(target=self.image_worker, name=f'pipeline-images-{index}')
+            for index in range(IMAGE_WORKERS)
+        ]
+        self.sink_thread = threading.Thread(target=self.sink_worker, name='pipeline-sink')
+
+    def start(self):
+        for thread in self.image_threads:
+            thread.start()
+        self.sink_thread.start()
+
+    def add_stat(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    async def put_row(self, category, position, row):
+        """Hand a scraped row to the image stage, yielding to the event loop while its queue is full"""
+        item = (category, position, row)
+        while True:
+            try:
+                self.images.put_nowait(item)
+                return
+            except queue.Full:
+                self.add_stat('stalls')
+                await asyncio.sleep(BACKPRESSURE_POLL)
+
+    def category_done(self, category, rows):
+        """Tell the sink that category's scrape produced rows rows"""
+        self.sink.put(('done', category, rows))
+
+    def image_worker(self):
+        while True:
+            item = self.images.get()
+            if item is None:
+                return
+            category, position, row = item
+            started = time.perf_counter()
+            try:
+                _, paths = download_images.process_row((position, dict(zip(bananina.CSV_HEADER, row)), category))
+            except Exception as e:
+                print(f"\nError downloading images of {category} row {position}: {str(e)}")
+                paths = {'primary': None, 'hover': None}
+            if self.variants:
+                for local_path in paths.values():
+                    if local_path:
+                        self.variants.submit(local_path, category)
+            self.add_stat('image_seconds', time.perf_counter() - started)
+            self.sink.put(('row', category, (position, row + [paths['primary'] or '', paths['hover'] or ''])))
+
+    def sink_worker(self):
+        try:
+            conn, dialect = self.connect()
+        except Exception as e:
+            # The CSVs are still written, and the rows can be loaded from them later
+            print(f"\nCan't open the database, loading nothing: {str(e)}")
+            conn = dialect = None
+        seen = (set(), set())
+        batch = []
+        files = {}
+
+        def load():
+            if conn is None:
+                self.add_stat('load_failed', len(batch))
+                batch.clear()
+                return
+            started = time.perf_counter()
+            try:
+                result = load_catalog.load_catalog(conn, dialect, batch, LOAD_BATCH_SIZE, seen)
+                self.add_stat('loaded', result['loaded'])
+                self.add_stat('skipped', result['skipped'])
+            except Exception as e:
+                # Keep draining the queue; a stuck sink would stall the whole run
+                print(f"\nError loading {len(batch)} rows into {dialect.name}: {str(e)}")
+                self.add_stat('load_failed', len(batch))
+            batch.clear()
+            self.add_stat('sink_seconds', time.perf_counter() - started)
+
+        def finish_file(category):
+            files.pop(category).close(keep=True)
+            self.add_stat('files')
+
+        try:
+            while True:
+                try:
+                    item = self.sink.get(timeout=LOAD_IDLE_SECONDS)
+                except queue.Empty:
+                    if batch:
+                        load()
+                    continue
+                if item is None:
+                    break
+
+                kind, category, payload = item
+                if kind == 'done' and not payload and category not in files:
+                    continue  # Nothing scraped; the previous CSV stays
+                started = time.perf_counter()
+                if category not in files:
+                    files[category] = _CategoryFile(category)
+                if kind == 'done':
+                    files[category].expected = payload
+                else:
+                    position, row = payload
+                    files[category].add(position, row)
+                    batch.append((category, dict(zip(OUTPUT_HEADER, row))))
+                    self.add_stat('rows')
+                if files[category].complete():
+                    finish_file(category)
+                self.add_stat('sink_seconds', time.perf_counter() - started)
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    load()
+
+            if batch:
+                load()
+            if conn is not None and self.stats['loaded']:
+                # Until the index is rebuilt, the products just loaded are searched with LIKE
+                try:
+                    products, _, _, _ = search_index.rebuild_index(conn, dialect)
+                    self.add_stat('indexed', len(products))
+                except Exception as e:
+                    print(f"\nError rebuilding the search index in {dialect.name}: {str(e)}")
+        finally:
+            # Categories whose scrape failed keep the CSV the scraper left
+            for category, category_file in list(files.items()):
+                category_file.close(keep=False)
+                self.unfinished.append(category)
+            if conn is not None:
+                conn.close()
+
+    def finish(self):
+        """Wait for the rows already handed over to go through every stage"""
+        for _ in self.image_threads:
+            self.images.put(None)
+        for thread in self.image_threads:
+            thread.join()
+        self.sink.put(None)
+        self.sink_thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scrape, download images and load the database in one overlapping run"
+    )
+    parser.add_argument('--resume', action='store_true',
+                        help="continue interrupted categories from their journals")
+    parser.add_argument('--concurrency', type=int, default=bananina.DETAIL_CONCURRENCY,
+                        help="detail pages fetched at the same time per category")
+    load_catalog.add_database_arguments(parser)
+    args = parser.parse_args()
+
+    variants = None
+    if download_images.GENERATE_VARIANTS:
+        if pillow_available():
+            variants = VariantStage()
+        else:
+            print("Pillow is not installed, skipping image variants")
+
+    download_images.download_stats.clear()
+    pipeline = Pipeline(lambda: load_catalog.connect_from_args(args), variants)
+    start_time = time.time()
+    pipeline.start()
+    try:
+        bananina.scrape_main(resume=args.resume, concurrency=args.concurrency, sink=pipeline)
+        scrape_duration = time.time() - start_time
+    finally:
+        pipeline.finish()
+    duration = time.time() - start_time
+
+    stats = pipeline.stats
+    print(f"\n{'='*50}")
+    print(f"Pipeline completed in {duration:.2f} seconds, scraping took {scrape_duration:.2f}")
+    print(f"Rows through the sink: {stats['rows']}, CSVs written: {stats['files']}")
+    if pipeline.unfinished:
+        print(f"Incomplete categories, CSV left as scraped: {', '.join(sorted(pipeline.unfinished))}")
+    print(f"Loaded into the database: {stats['loaded']}, skipped: {stats['skipped']}, "
+          f"failed: {stats['load_failed']}, search index rebuilt over {stats['indexed']} products")
+    print(f"Image workers busy {stats['image_seconds']:.2f}s over {IMAGE_WORKERS} threads, "
+          f"sink busy {stats['sink_seconds']:.2f}s")
+    print(f"Scraper held back by a full image queue {stats['stalls']} times")
+    download_images.print_throughput(duration)
+    print_scheduler_stats()
+    if variants:
+        variants.finish()
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
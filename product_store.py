@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sqlite3
+from collections import Counter
+
+class ProductStore:
+    """Persistent per-category product state keyed by SKU.
+
+    Each entry keeps the CSV row last written for the product, the listing
+    fields used to decide whether its detail page must be fetched again,
+    a hash of the row and when its details were last fetched. Products that
+    disappear from the listing are kept but marked inactive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                category TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                price TEXT,
+                original_price TEXT,
+                discount TEXT,
+                row_json TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                details_fetched_at REAL,
+                last_seen_at REAL NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (category, sku)
+            )
+        ''')
+        self.conn.commit()
+
+    def load_category(self, category):
+        """Return the stored entries of a category as a dict keyed by SKU"""
+        cursor = self.conn.execute('''
+            SELECT sku, price, original_price, discount, row_json, content_hash, details_fetched_at
+            FROM products WHERE category = ?
+        ''', (category,))
+        return {
+            sku: {
+                'price': price,
+                'original_price': original_price,
+                'discount': discount,
+                'row': json.loads(row_json),
+                'content_hash': content_hash,
+                'details_fetched_at': details_fetched_at
+            }
+            for sku, price, original_price, discount, row_json, content_hash, details_fetched_at in cursor
+        }
+
+    def save_category(self, category, entries, seen_at):
+        """Store this run's entries and return how many SKUs were new, changed, unchanged or gone"""
+        previous = {
+            sku: content_hash
+            for sku, content_hash in self.conn.execute(
+                'SELECT sku, content_hash FROM products WHERE category = ? AND active = 1', (category,)
+            )
+        }
+        counts = Counter(new=0, changed=0, unchanged=0, gone=0)
+        records = []
+        for entry in entries:
+            row_json = json.dumps(entry['row'], ensure_ascii=False)
+            content_hash = hashlib.sha1(row_json.encode('utf-8')).hexdigest()
+            old_hash = previous.get(entry['sku'])
+            if old_hash is None:
+                counts['new'] += 1
+            elif old_hash != content_hash:
+                counts['changed'] += 1
+            else:
+                counts['unchanged'] += 1
+            records.append((
+                category, entry['sku'], entry['position'], entry['price'], entry['original_price'],
+                entry['discount'], row_json, content_hash, entry['details_fetched_at'], seen_at
+            ))
+
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO products (
+                    category, sku, position, price, original_price, discount,
+                    row_json, content_hash, details_fetched_at, last_seen_at, active
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (category, sku) DO UPDATE SET
+                    position = excluded.position,
+                    price = excluded.price,
+                    original_price = excluded.original_price,
+                    discount = excluded.discount,
+                    row_json = excluded.row_json,
+                    content_hash = excluded.content_hash,
+                    details_fetched_at = excluded.details_fetched_at,
+                    last_seen_at = excluded.last_seen_at,
+                    active = 1
+            ''', records)
+            cursor = self.conn.execute('''
+                UPDATE products SET active = 0
+                WHERE category = ? AND active = 1 AND last_seen_at < ?
+            ''', (category, seen_at))
+            counts['gone'] = cursor.rowcount
+        return counts
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,69 @@
+import json
+import os
+from pathlib import Path
+
+class CategoryJournal:
+    """Append-only JSON lines journal of one category run.
+
+    The journal records every listing page (its records and whether another
+    page follows) and every product row whose details were fetched. Rows are
+    flushed to disk in batches. A resumed run replays the listing pages
+    instead of loading them again and skips products that already have a
+    row. The journal is deleted once the category has been written out.
+    """
+
+    def __init__(self, path, resume=False, batch_size=20):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.pages = []
+        self.rows = {}
+        self._unflushed = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists():
+            self._load()
+        else:
+            self.path.write_text('', encoding='utf-8')
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        data = self.path.read_bytes()
+        # A crash can leave half a line at the end; drop it before appending again
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) != len(data):
+            with open(self.path, 'r+b') as file:
+                file.truncate(len(complete))
+
+        for line in complete.decode('utf-8').splitlines():
+            entry = json.loads(line)
+            if entry['type'] == 'listing':
+                self.pages.append((entry['page'], entry['records'], entry['has_next']))
+            elif entry['type'] == 'row':
+                self.rows[entry['key']] = entry
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def record_listing(self, page, records, has_next):
+        """Journal one listing page; these are flushed right away since there are few"""
+        self._write({'type': 'listing', 'page': page, 'records': records, 'has_next': has_next})
+        self.flush()
+
+    def record_row(self, key, row, details_fetched_at):
+        """Journal a finished product row, flushing once a batch has built up"""
+        self._write({'type': 'row', 'key': key, 'row': row, 'details_fetched_at': details_fetched_at})
+        self._unflushed += 1
+        if self._unflushed >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unflushed = 0
+
+    def close(self, finished=False):
+        """Flush and close the journal, deleting it when the category is done"""
+        self.flush()
+        self.file.close()
+        if finished:
+            self.path.unlink()
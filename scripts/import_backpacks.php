@@ -159,8 +159,13 @@ try {
             if ($productId) {
                 // Only process images if they exist
                 if (!empty($row[13])) {
-                    $primaryImagePath = '/assets/images/' . $category_name . '/' . str_replace(['images\\' . $category_name . '\\', 'images/' . $category_name . '/'], '', $row[13]);
-                    $primaryImagePath = str_replace('\\', '/', $primaryImagePath);
+                    $primaryImagePath = str_replace('\\', '/', $row[13]);
+                    if (strpos($primaryImagePath, 'images/store/') === 0) {
+                        // Content-addressed store written by download_images.py
+                        $primaryImagePath = '/assets/' . $primaryImagePath;
+                    } else {
+                        $primaryImagePath = '/assets/images/' . $category_name . '/' . str_replace('images/' . $category_name . '/', '', $primaryImagePath);
+                    }
                     
                     $galleryStmt->execute([
                         ':product_id' => $productId,
@@ -171,8 +176,13 @@ try {
                 }
 
                 if (!empty($row[14])) {
-                    $hoverImagePath = '/assets/images/' . $category_name . '/' . str_replace(['images\\' . $category_name . '\\', 'images/' . $category_name . '/'], '', $row[14]);
-                    $hoverImagePath = str_replace('\\', '/', $hoverImagePath);
+                    $hoverImagePath = str_replace('\\', '/', $row[14]);
+                    if (strpos($hoverImagePath, 'images/store/') === 0) {
+                        // Content-addressed store written by download_images.py
+                        $hoverImagePath = '/assets/' . $hoverImagePath;
+                    } else {
+                        $hoverImagePath = '/assets/images/' . $category_name . '/' . str_replace('images/' . $category_name . '/', '', $hoverImagePath);
+                    }
                     
                     $galleryStmt->execute([
                         ':product_id' => $productId,
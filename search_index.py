@@ -0,0 +1,236 @@
+import argparse
+import re
+import time
+from collections import defaultdict
+
+import load_catalog
+
+# Words are runs of letters and digits, as the storefront splits search input
+TOKEN = re.compile(r'[^\W_]+')
+
+# Longest term stored; longer words are cut so they fit the term column
+MAX_TERM_LENGTH = 64
+
+# Rows written per executemany call
+BATCH_SIZE = 5000
+
+# The price filters of pages/products.php, as (value, label, minimum, maximum)
+PRICE_BUCKETS = [
+    ('0-3000000', 'Under IDR 3M', 0, 3000000),
+    ('3000000-5000000', 'IDR 3M - 5M', 3000000, 5000000),
+    ('5000000-10000000', 'IDR 5M - 10M', 5000000, 10000000),
+    ('10000000-20000000', 'IDR 10M - 20M', 10000000, 20000000),
+    ('20000000-999999999', 'Above IDR 20M', 20000000, 999999999),
+]
+
+# Terms compare byte for byte. MySQL's default accent-insensitive collation would make
+# 'bombe' and 'bombé' one key, and the prefix ranges rely on code point order.
+TERM_COLLATION = {'mysql': ' COLLATE utf8mb4_bin'}
+
+# The same as in database_schema.sql; {collation} is filled from TERM_COLLATION
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS search_terms (
+        id INT PRIMARY KEY,
+        term VARCHAR(64){collation} NOT NULL UNIQUE,
+        products INT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS search_postings (
+        term_id INT NOT NULL,
+        product_id INT NOT NULL,
+        PRIMARY KEY (term_id, product_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS search_facets (
+        facet VARCHAR(20) NOT NULL,
+        value VARCHAR(50) NOT NULL,
+        label VARCHAR(100) NOT NULL,
+        products INT NOT NULL,
+        PRIMARY KEY (facet, value)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS search_builds (
+        built_at TIMESTAMP NOT NULL
+    )''',
+]
+
+# What the storefront searched before the index, for the products p joined with their brands b
+LIKE_CONDITION = "(p.name LIKE {0} OR p.description LIKE {0} OR b.name LIKE {0})"
+
+# Products changed since the index was built, found through idx_updated and matched with LIKE
+CHANGED_PRODUCTS = (
+    "p.id IN (SELECT cp.id FROM products cp LEFT JOIN brands cb ON cb.id = cp.brand_id "
+    "WHERE cp.updated_at >= {0} AND (cp.name LIKE {0} OR cp.description LIKE {0} OR cb.name LIKE {0}))"
+)
+
+def tokenize(text):
+    """Return the distinct lowercase words of text"""
+    return {token[:MAX_TERM_LENGTH] for token in TOKEN.findall((text or '').lower())}
+
+def suffixes(terms):
+    """Return every suffix of every term, so a prefix of one finds text inside a word as LIKE does"""
+    return {term[start:] for term in terms for start in range(len(term))}
+
+def database_now(conn):
+    """Return the database's CURRENT_TIMESTAMP, the clock products.updated_at is set from"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT CURRENT_TIMESTAMP")
+    return cursor.fetchone()[0]
+
+def read_products(conn):
+    """Return the active products with the text and facet fields the index covers"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT p.id, p.name, p.description, p.details, b.name, p.category_id, c.name, p.brand_id, p.price
+        FROM products p
+        LEFT JOIN brands b ON p.brand_id = b.id
+        LEFT JOIN categories c ON p.category_id = c.id
+        WHERE p.is_active = 1
+    ''')
+    return cursor.fetchall()
+
+def build_index(products):
+    """Return (terms, postings, facets) for products.
+
+    terms is a list of (id, term, product count) in term order, postings a
+    list of (term id, product id) and facets a list of (facet, value,
+    label, product count) for categories, brands and price buckets.
+    """
+    term_products = defaultdict(set)
+    facet_counts = defaultdict(int)
+    facet_labels = {}
+    for product_id, name, description, details, brand, category_id, category, brand_id, price in products:
+        for term in suffixes(tokenize(brand) | tokenize(name) | tokenize(description) | tokenize(details)):
+            term_products[term].add(product_id)
+
+        if category_id is not None:
+            facet_counts[('category', str(category_id))] += 1
+            facet_labels[('category', str(category_id))] = category or ''
+        if brand_id is not None:
+            facet_counts[('brand', str(brand_id))] += 1
+            facet_labels[('brand', str(brand_id))] = brand or ''
+        for value, label, minimum, maximum in PRICE_BUCKETS:
+            # BETWEEN in the storefront includes both ends, so a boundary price counts twice there too
+            if minimum <= float(price or 0) <= maximum:
+                facet_counts[('price', value)] += 1
+                facet_labels[('price', value)] = label
+
+    terms = []
+    postings = []
+    for term_id, term in enumerate(sorted(term_products), 1):
+        product_ids = term_products[term]
+        terms.append((term_id, term, len(product_ids)))
+        postings.extend((term_id, product_id) for product_id in sorted(product_ids))
+    facets = [(facet, value, facet_labels[(facet, value)], count)
+              for (facet, value), count in sorted(facet_counts.items())]
+    return terms, postings, facets
+
+def write_index(conn, dialect, terms, postings, facets, built_at):
+    """Replace the index tables' contents in one transaction.
+
+    built_at is the database time taken before the products were read;
+    products updated since then are searched without the index.
+    """
+    cursor = conn.cursor()
+    collation = TERM_COLLATION.get(dialect.name, '')
+    for statement in SCHEMA:
+        cursor.execute(statement.format(collation=collation))
+    conn.commit()
+
+    try:
+        for table in ('search_postings', 'search_terms', 'search_facets', 'search_builds'):
+            cursor.execute(f"DELETE FROM {table}")
+        tables = (('search_terms', terms), ('search_postings', postings),
+                  ('search_facets', facets), ('search_builds', [(built_at,)]))
+        for table, rows in tables:
+            if not rows:
+                continue
+            sql = f"INSERT INTO {table} VALUES ({dialect.placeholders(len(rows[0]))})"
+            for offset in range(0, len(rows), BATCH_SIZE):
+                cursor.executemany(sql, rows[offset:offset + BATCH_SIZE])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def rebuild_index(conn, dialect):
+    """Rebuild the index from the catalog tables; return (products, terms, postings, facets)"""
+    built_at = database_now(conn)
+    products = read_products(conn)
+    terms, postings, facets = build_index(products)
+    write_index(conn, dialect, terms, postings, facets, built_at)
+    return products, terms, postings, facets
+
+def index_built_at(conn):
+    """Return when the index was last built, or None if it never was"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT built_at FROM search_builds")
+    except Exception:
+        return None
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def changed_since(conn, dialect, built_at):
+    """Return whether any product was updated since the index was built, through idx_updated"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT 1 FROM products WHERE updated_at >= {dialect.placeholder} LIMIT 1", [built_at])
+    return cursor.fetchone() is not None
+
+def search_condition(text, dialect, built_at, changed=True):
+    """Return (SQL condition on p, parameters) matching the products that text finds.
+
+    Products last updated before built_at match when every word of text
+    is a prefix of one of their indexed terms. The terms are every suffix
+    of their words, so a word finds text inside a word as LIKE did. Each
+    word is written as a range on search_terms.term, so MySQL and SQLite
+    both answer it from the unique index on that column. A text without words matches none
+    of them. Products updated since the build aren't in the index, or
+    are in it with their old text, so they go through the LIKE scan it
+    replaced; the OR of two id lists lets the database union them instead
+    of scanning products. When changed_since found no such products the
+    index alone answers. This is the condition pages/products.php adds
+    for a search.
+    """
+    placeholder = dialect.placeholder
+    conditions = []
+    word_params = []
+    for word in sorted(tokenize(text)):
+        conditions.append(
+            "p.id IN (SELECT sp.product_id FROM search_postings sp JOIN search_terms st ON st.id = sp.term_id "
+            f"WHERE st.term >= {placeholder} AND st.term < {placeholder})"
+        )
+        # The smallest string above every term starting with word
+        word_params += [word, word[:-1] + chr(ord(word[-1]) + 1)]
+    indexed = ' AND '.join(conditions) or '1 = 0'
+    if not changed:
+        return indexed, word_params
+    condition = f"((p.updated_at < {placeholder} AND {indexed}) OR {CHANGED_PRODUCTS.format(placeholder)})"
+    return condition, [built_at] + word_params + [built_at] + [f"%{text}%"] * 3
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the storefront's search index and facets from the catalog tables")
+    load_catalog.add_database_arguments(parser)
+    args = parser.parse_args()
+
+    conn, dialect = load_catalog.connect_from_args(args)
+    start_time = time.perf_counter()
+    try:
+        built_at = database_now(conn)
+        products = read_products(conn)
+        read_time = time.perf_counter() - start_time
+        started = time.perf_counter()
+        terms, postings, facets = build_index(products)
+        build_time = time.perf_counter() - started
+        started = time.perf_counter()
+        write_index(conn, dialect, terms, postings, facets, built_at)
+        write_time = time.perf_counter() - started
+    finally:
+        conn.close()
+    duration = time.perf_counter() - start_time
+
+    print(f"\n{'='*50}")
+    print(f"Indexed {len(products)} products in {dialect.name} in {duration:.2f} seconds")
+    print(f"Terms: {len(terms)}, postings: {len(postings)}, facet values: {len(facets)}")
+    print(f"Read: {read_time:.3f}s, build: {build_time:.3f}s, write: {write_time:.3f}s")
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
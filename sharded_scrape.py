@@ -0,0 +1,313 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict
+
+import bananina
+from bananina import (
+    ListingRecord, CSV_HEADER, DETAIL_CONCURRENCY, STATE_DB,
+    build_row, details_from_row, empty_product_details, needs_details, product_key
+)
+from product_store import ProductStore
+from work_queue import WorkQueue
+
+# The SQLite file holding the task queue; workers on other machines open the same file
+QUEUE_DB = os.environ.get('BANANINA_QUEUE_DB', 'scrape_queue.db')
+
+# Worker processes started by the coordinator on this machine
+WORKERS = int(os.environ.get('BANANINA_WORKERS', os.cpu_count() or 2))
+
+# How long an idle worker waits before asking the queue again
+POLL_SECONDS = 0.5
+
+# Listing pages go first so detail tasks are discovered as early as possible
+LISTING_PRIORITY = 10
+DETAIL_PRIORITY = 0
+
+def listing_task(category, url, page, started_at):
+    return (f"listing:{category}:{page}", 'listing', LISTING_PRIORITY,
+            {'category': category, 'url': url, 'page': page, 'started_at': started_at})
+
+def seed_run(queue, categories):
+    """Start a new run with the first listing page of every category; return the run id"""
+    started_at = time.time()
+    # The suffix keeps two runs seeded in the same second from sharing each other's tasks
+    run = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))}-{uuid.uuid4().hex[:8]}"
+    queue.put(run, [listing_task(category, url, 1, started_at) for category, url in categories.items()])
+    return run
+
+class StoredProducts:
+    """Per-process cache of the product store, loaded once per category"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.categories = {}
+
+    def get(self, category):
+        with self.lock:
+            if category not in self.categories:
+                store = ProductStore(STATE_DB)
+                try:
+                    self.categories[category] = store.load_category(category)
+                finally:
+                    store.close()
+            return self.categories[category]
+
+def run_listing(payload, stored):
+    """Load one listing page; its products and the next page become new tasks"""
+    category = payload['category']
+    records, has_next = bananina.get_browser_service().run(
+        bananina.fetch_listing_page(payload['url'], payload['page'])
+    )
+    follow_up = [
+        (f"detail:{category}:{product_key(record, category)}", 'detail', DETAIL_PRIORITY, {
+            'category': category,
+            'page': payload['page'],
+            'index': index,
+            'record': asdict(record),
+            'started_at': payload['started_at']
+        })
+        for index, record in enumerate(records)
+    ]
+    if has_next:
+        follow_up.append(listing_task(category, payload['url'], payload['page'] + 1, payload['started_at']))
+    return {'products': len(records), 'has_next': has_next}, follow_up
+
+def run_detail(payload, stored):
+    """Build one product's CSV row, fetching its detail page only when needed"""
+    category = payload['category']
+    record = ListingRecord(**payload['record'])
+    key = product_key(record, category)
+    previous = stored.get(category).get(key)
+    now = payload['started_at']
+    if needs_details(record, previous, now):
+        product_details = bananina.get_browser_service().run(bananina.fetch_details(record.product_link))
+        product_details, details_fetched_at = kept_details(previous, product_details, now)
+    else:
+        product_details = details_from_row(previous['row'])
+        details_fetched_at = previous['details_fetched_at']
+    return entry_for(key, record, product_details, details_fetched_at), ()
+
+def kept_details(previous, product_details, details_fetched_at):
+    """Return previous's last good details instead of a failed (all N/A) fetch, as process_listing_stream does"""
+    if (previous and product_details == empty_product_details()
+            and details_from_row(previous['row']) != empty_product_details()):
+        # Still due for a refetch once the detail TTL runs out
+        return details_from_row(previous['row']), previous['details_fetched_at']
+    return product_details, details_fetched_at
+
+def entry_for(key, record, product_details, details_fetched_at):
+    return {
+        'sku': key,
+        'price': record.price,
+        'original_price': record.original_price,
+        'discount': record.discount,
+        'row': build_row(record, product_details),
+        'details_fetched_at': details_fetched_at
+    }
+
+HANDLERS = {'listing': run_listing, 'detail': run_detail}
+
+def work_loop(queue_path, run, owner, stored):
+    """Lease, run and acknowledge tasks until the run has none pending or leased"""
+    queue = WorkQueue(queue_path)
+    try:
+        while True:
+            task = queue.lease(run, owner)
+            if task is None:
+                counts = queue.counts(run)
+                if not counts.get('pending') and not counts.get('leased'):
+                    return
+                time.sleep(POLL_SECONDS)
+                continue
+
+            started = time.perf_counter()
+            try:
+                result, follow_up = HANDLERS[task['kind']](task['payload'], stored)
+            except Exception as e:
+                print(f"\nTask {task['key']} failed (attempt {task['attempt']}): {str(e)}")
+                queue.nack(task, owner, e)
+                continue
+            result['seconds'] = time.perf_counter() - started
+            queue.ack(run, task, owner, result, follow_up)
+    finally:
+        queue.close()
+
+def run_worker(queue_path, run, concurrency=DETAIL_CONCURRENCY):
+    """Work on run with concurrency threads in this process, until the queue is drained"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    stored = StoredProducts()
+    threads = [
+        threading.Thread(target=work_loop, args=(queue_path, run, f"{owner}:{index}", stored))
+        for index in range(max(1, concurrency))
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        bananina.close_browser_service()
+
+def worker_process(queue_path, run, concurrency, host_rate):
+    """Entry point of a worker process started by the coordinator"""
+    # The coordinator's rate budget is split between its workers
+    bananina.HOST_RATE = host_rate
+    run_worker(queue_path, run, concurrency)
+
+def merge_run(queue, run):
+    """Write the CSV of every category of run in listing order and update the product store.
+
+    A category with a listing page that failed for good is only partly known,
+    so its CSV and stored products are left as they were. Details that failed
+    for good keep the product's last good details, or get N/A fields rather
+    than losing the row. Returns (category -> rows written, failed categories).
+    """
+    listings = queue.tasks(run, 'listing')
+    categories = sorted({payload['category'] for _, _, _, payload, _ in listings})
+    failed = sorted({payload['category'] for _, _, state, payload, _ in listings if state != 'done'})
+    started_at = min((payload['started_at'] for _, _, _, payload, _ in listings), default=time.time())
+
+    written = {}
+    store = ProductStore(STATE_DB)
+    try:
+        stored = {category: store.load_category(category) for category in categories}
+        details = {category: [] for category in categories}
+        for key, _, state, payload, result in queue.tasks(run, 'detail'):
+            category = payload['category']
+            if state == 'done':
+                entry = result
+            else:
+                record = ListingRecord(**payload['record'])
+                key = product_key(record, category)
+                product_details, details_fetched_at = kept_details(
+                    stored[category].get(key), empty_product_details(), None
+                )
+                entry = entry_for(key, record, product_details, details_fetched_at)
+            details[category].append(((payload['page'], payload['index']), entry))
+
+        for category in categories:
+            if category in failed:
+                print(f"Listing of {category} failed, keeping its previous CSV")
+                continue
+            entries = [entry for _, entry in sorted(details[category], key=lambda item: item[0])]
+            if not entries:
+                print(f"No products found for {category}, keeping its previous CSV")
+                written[category] = 0
+                continue
+            for position, entry in enumerate(entries):
+                entry['position'] = position
+
+            filename = f"{category}_bags.csv"
+            temp_filename = f"{filename}.tmp"
+            with open(temp_filename, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(CSV_HEADER)
+                writer.writerows(entry['row'] for entry in entries)
+            os.replace(temp_filename, filename)
+
+            counts = store.save_category(category, entries, started_at)
+            print(f"Saved {len(entries)} products to {filename}: {counts['new']} new, "
+                  f"{counts['changed']} changed, {counts['unchanged']} unchanged, {counts['gone']} gone")
+            written[category] = len(entries)
+    finally:
+        store.close()
+    return written, failed
+
+def wait_for_run(queue, run, processes=()):
+    """Block until no task of run is pending or leased, printing progress.
+
+    Raises RuntimeError if every local worker process in processes has
+    exited while tasks are still left.
+    """
+    while True:
+        # Checked before the counts, so a last worker that drained the queue isn't taken for a crash
+        workers_gone = bool(processes) and not any(process.is_alive() for process in processes)
+        counts = queue.counts(run)
+        if not counts.get('pending') and not counts.get('leased'):
+            print()
+            return counts
+        if workers_gone:
+            print()
+            exit_codes = ', '.join(str(process.exitcode) for process in processes)
+            raise RuntimeError(f"All workers exited with {counts.get('pending', 0)} tasks pending and "
+                               f"{counts.get('leased', 0)} leased (exit codes {exit_codes}); "
+                               f"continue the run with --resume")
+        print(f"\rTasks: {counts.get('done', 0)} done, {counts.get('leased', 0)} running, "
+              f"{counts.get('pending', 0)} pending, {counts.get('failed', 0)} failed", end='', flush=True)
+        time.sleep(1)
+
+def run_sharded(categories, workers=WORKERS, concurrency=DETAIL_CONCURRENCY, queue_path=QUEUE_DB, resume=False):
+    """Coordinate a sharded scrape of categories (name -> URL) and merge the results.
+
+    With workers=0 no local workers are started; workers on other machines
+    sharing queue_path do the work while the coordinator waits for them.
+    """
+    queue = WorkQueue(queue_path)
+    try:
+        run = queue.latest_run() if resume else None
+        if run:
+            print(f"Resuming run {run}")
+        else:
+            run = seed_run(queue, categories)
+            print(f"Started run {run} with {len(categories)} categories")
+
+        processes = [
+            multiprocessing.Process(
+                target=worker_process,
+                args=(queue_path, run, concurrency, bananina.HOST_RATE / workers)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        counts = wait_for_run(queue, run, processes)
+        for process in processes:
+            process.join()
+
+        written, failed = merge_run(queue, run)
+        return run, counts, written, failed
+    finally:
+        queue.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape categories through a durable task queue shared by worker processes")
+    parser.add_argument('mode', nargs='?', choices=['run', 'worker'], default='run',
+                        help="run: seed, work and merge; worker: only work on the queue's latest run")
+    parser.add_argument('--queue', default=QUEUE_DB)
+    parser.add_argument('--workers', type=int, default=WORKERS, help="local worker processes (run mode)")
+    parser.add_argument('--concurrency', type=int, default=DETAIL_CONCURRENCY, help="tasks at a time per worker")
+    parser.add_argument('--resume', action='store_true', help="continue the queue's latest run")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.mode == 'worker':
+        queue = WorkQueue(args.queue)
+        run = queue.latest_run()
+        queue.close()
+        if run is None:
+            print("The queue has no run to work on")
+            return
+        print(f"Working on run {run}")
+        run_worker(args.queue, run, args.concurrency)
+        return
+
+    run, counts, written, failed = run_sharded(bananina.get_category_urls(), args.workers, args.concurrency,
+                                       args.queue, args.resume)
+    duration = time.time() - start_time
+
+    print(f"\n{'='*50}")
+    print(f"Run {run} completed in {duration:.2f} seconds with {args.workers} workers")
+    print(f"Tasks: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed")
+    print(f"Products written: {sum(written.values())} in {sum(1 for rows in written.values() if rows)} categories")
+    if failed:
+        print(f"Failed categories (previous CSV kept): {', '.join(failed)}")
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import load_catalog
+
+def catalog_row(name, sku, condition='New With Tag'):
+    return {
+        'Brand': 'Hermes', 'Name': name, 'Price': 'IDR 3.500.000', 'SKU': sku,
+        'Description': 'Tote bag', 'Details': 'Leather', 'Condition': condition,
+        'Primary Image Local Path': 'images/totes/a.jpg', 'Hover Image Local Path': 'images/totes/b.jpg'
+    }
+
+def test_condition_is_stored_without_the_completeness_items(tmp_path):
+    conn, dialect = load_catalog.connect_sqlite(tmp_path / 'catalog.db')
+    condition = 'New With Tag | Completeness: Long Strap | Dustbag | Box | Barcode Tag | Care Card'
+    load_catalog.load_catalog(conn, dialect, [('totes', catalog_row('Evelyne', 'H1', condition))])
+
+    assert conn.execute("SELECT condition_status FROM products").fetchall() == [('New With Tag',)]
+
+def test_a_row_whose_sku_another_product_owns_is_skipped(tmp_path):
+    conn, dialect = load_catalog.connect_sqlite(tmp_path / 'catalog.db')
+    load_catalog.load_catalog(conn, dialect, [('totes', catalog_row('Evelyne', 'H1'))])
+
+    result = load_catalog.load_catalog(conn, dialect, [
+        ('totes', catalog_row('Evelyne PM', 'H1')),
+        ('totes', catalog_row('Picotin', 'H2'))
+    ])
+
+    assert (result['loaded'], result['skipped'], result['sku_conflicts']) == (1, 1, 1)
+    assert conn.execute("SELECT slug, sku FROM products ORDER BY id").fetchall() == [
+        ('evelyne', 'H1'), ('picotin', 'H2')
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM product_galleries").fetchone() == (4,)
+
+def test_reloading_a_product_updates_it_in_place(tmp_path):
+    conn, dialect = load_catalog.connect_sqlite(tmp_path / 'catalog.db')
+    load_catalog.load_catalog(conn, dialect, [('totes', catalog_row('Evelyne', 'H1'))])
+    row = catalog_row('Evelyne', 'H1')
+    row['Price'] = 'IDR 4.000.000'
+    load_catalog.load_catalog(conn, dialect, [('totes', row)])
+
+    assert conn.execute("SELECT slug, price FROM products").fetchall() == [('evelyne', 4000000)]
+    assert conn.execute("SELECT COUNT(*) FROM product_galleries").fetchone() == (2,)
@@ -0,0 +1,135 @@
+from dataclasses import asdict
+
+import pytest
+
+import bananina
+import sharded_scrape
+from bananina import ListingRecord, build_row, empty_product_details
+from product_store import ProductStore
+from work_queue import WorkQueue
+
+GOOD_DETAILS = {'quality': 'A', 'description': 'Tote', 'details': 'Leather', 'condition': 'New With Tag'}
+
+class ExitedProcess:
+    exitcode = 1
+
+    def is_alive(self):
+        return False
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def state_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sharded_scrape, 'STATE_DB', str(tmp_path / 'state.db'))
+    return str(tmp_path / 'state.db')
+
+def listing_record(sku):
+    return ListingRecord('Hermes', f"Bag {sku}", 'IDR 100', 'N/A', 'N/A', f"https://example.com/{sku}",
+                         'a.jpg', 'b.jpg', sku)
+
+def store_previous(state_db, record, fetched_at):
+    store = ProductStore(state_db)
+    entry = sharded_scrape.entry_for(record.sku, record, GOOD_DETAILS, fetched_at)
+    entry['position'] = 0
+    store.save_category('totes', [entry], fetched_at)
+    store.close()
+
+def seed_with_one_product(queue, record, listing_done=True):
+    run = sharded_scrape.seed_run(queue, {'totes': 'https://example.com/totes.html'})
+    task = queue.lease(run, 'w1')
+    detail = (f"detail:totes:{record.sku}", 'detail', sharded_scrape.DETAIL_PRIORITY, {
+        'category': 'totes', 'page': 1, 'index': 0, 'record': asdict(record),
+        'started_at': task['payload']['started_at']
+    })
+    follow_up = [detail]
+    if not listing_done:
+        follow_up.append(sharded_scrape.listing_task('totes', 'https://example.com/totes.html', 2,
+                                                     task['payload']['started_at']))
+    queue.ack(run, task, 'w1', {'products': 1, 'has_next': not listing_done}, follow_up)
+    return run
+
+def test_runs_seeded_in_the_same_second_get_their_own_tasks(queue, monkeypatch):
+    monkeypatch.setattr(sharded_scrape.time, 'time', lambda: 1700000000.0)
+    categories = {'totes': 'https://example.com/totes.html'}
+
+    first = sharded_scrape.seed_run(queue, categories)
+    task = queue.lease(first, 'w1')
+    queue.ack(first, task, 'w1', {'products': 0, 'has_next': False})
+    second = sharded_scrape.seed_run(queue, categories)
+
+    assert first != second
+    assert queue.counts(first) == {'done': 1}
+    assert queue.counts(second) == {'pending': 1}
+
+def test_wait_for_run_fails_when_every_worker_has_exited(queue):
+    run = sharded_scrape.seed_run(queue, {'totes': 'https://example.com/totes.html'})
+
+    with pytest.raises(RuntimeError, match='All workers exited'):
+        sharded_scrape.wait_for_run(queue, run, [ExitedProcess(), ExitedProcess()])
+
+def test_wait_for_run_returns_once_drained_even_if_workers_exited(queue):
+    run = sharded_scrape.seed_run(queue, {'totes': 'https://example.com/totes.html'})
+    task = queue.lease(run, 'w1')
+    queue.ack(run, task, 'w1', {'products': 0, 'has_next': False})
+
+    assert sharded_scrape.wait_for_run(queue, run, [ExitedProcess()]) == {'done': 1}
+
+def test_merge_run_keeps_the_csv_of_a_category_whose_listing_failed(queue, state_db, tmp_path):
+    queue.max_attempts = 1
+    record = listing_record('H1')
+    (tmp_path / 'totes_bags.csv').write_text('previous\n')
+    run = seed_with_one_product(queue, record, listing_done=False)
+    queue.nack(queue.lease(run, 'w1'), 'w1', RuntimeError('page 2 timed out'))
+    queue.ack(run, queue.lease(run, 'w1'), 'w1', sharded_scrape.entry_for('H1', record, GOOD_DETAILS, 1.0))
+
+    assert sharded_scrape.merge_run(queue, run) == ({}, ['totes'])
+    assert (tmp_path / 'totes_bags.csv').read_text() == 'previous\n'
+    store = ProductStore(state_db)
+    assert store.load_category('totes') == {}
+    store.close()
+
+def test_merge_run_keeps_the_last_good_details_of_a_detail_that_failed(queue, state_db, tmp_path):
+    queue.max_attempts = 1
+    record = listing_record('H1')
+    store_previous(state_db, record, 1000.0)
+    run = seed_with_one_product(queue, record)
+    queue.nack(queue.lease(run, 'w1'), 'w1', RuntimeError('detail page timed out'))
+
+    assert sharded_scrape.merge_run(queue, run) == ({'totes': 1}, [])
+    store = ProductStore(state_db)
+    stored = store.load_category('totes')['H1']
+    store.close()
+    assert stored['row'] == build_row(record, GOOD_DETAILS)
+    assert stored['details_fetched_at'] == 1000.0
+    assert 'Leather' in (tmp_path / 'totes_bags.csv').read_text()
+
+def test_run_detail_keeps_the_last_good_details_when_the_refetch_fails(monkeypatch):
+    class FailedFetch:
+        def run(self, coroutine):
+            coroutine.close()
+            return empty_product_details()
+
+    async def fetch_details(link):
+        return empty_product_details()
+
+    class Stored:
+        def get(self, category):
+            return {'H1': {
+                'price': 'IDR 90', 'original_price': 'N/A', 'discount': 'N/A',
+                'row': build_row(record, GOOD_DETAILS), 'details_fetched_at': 1000.0
+            }}
+
+    monkeypatch.setattr(bananina, 'get_browser_service', FailedFetch)
+    monkeypatch.setattr(bananina, 'fetch_details', fetch_details)
+    record = listing_record('H1')
+    payload = {'category': 'totes', 'record': asdict(record), 'started_at': 2000.0}
+
+    entry, follow_up = sharded_scrape.run_detail(payload, Stored())
+
+    assert entry['row'] == build_row(record, GOOD_DETAILS)
+    assert entry['details_fetched_at'] == 1000.0
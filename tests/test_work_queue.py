@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from work_queue import WorkQueue
+
+RUN = '20250101-000000-test'
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'queue.db')
+
+@pytest.fixture
+def queue(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+def test_put_skips_keys_already_in_the_run(queue):
+    queue.put(RUN, [('a', 'detail', 0, {'n': 1})])
+    queue.put(RUN, [('a', 'detail', 0, {'n': 2}), ('b', 'detail', 0, {'n': 3})])
+    queue.put('other-run', [('a', 'detail', 0, {'n': 4})])
+
+    assert [(key, payload) for key, _, _, payload, _ in queue.tasks(RUN)] == [('a', {'n': 1}), ('b', {'n': 3})]
+    assert queue.counts('other-run') == {'pending': 1}
+
+def test_lease_takes_the_highest_priority_first_and_each_task_once(queue):
+    queue.put(RUN, [('detail', 'detail', 0, {}), ('listing', 'listing', 10, {})])
+
+    first = queue.lease(RUN, 'w1')
+    second = queue.lease(RUN, 'w2')
+
+    assert (first['key'], first['attempt']) == ('listing', 1)
+    assert second['key'] == 'detail'
+    assert queue.lease(RUN, 'w3') is None
+    assert queue.counts(RUN) == {'leased': 2}
+
+def test_ack_stores_the_result_and_enqueues_follow_up(queue):
+    queue.put(RUN, [('page1', 'listing', 10, {})])
+    task = queue.lease(RUN, 'w1')
+
+    assert queue.ack(RUN, task, 'w1', {'products': 2}, [('p1', 'detail', 0, {}), ('p2', 'detail', 0, {})])
+
+    assert queue.tasks(RUN, 'listing') == [('page1', 'listing', 'done', {}, {'products': 2})]
+    assert queue.counts(RUN) == {'done': 1, 'pending': 2}
+
+def test_ack_by_another_owner_writes_nothing(queue):
+    queue.put(RUN, [('page1', 'listing', 10, {})])
+    task = queue.lease(RUN, 'w1')
+
+    assert not queue.ack(RUN, task, 'w2', {'products': 1}, [('p1', 'detail', 0, {})])
+    assert queue.counts(RUN) == {'leased': 1}
+
+def test_nack_retries_until_max_attempts(queue):
+    queue.put(RUN, [('p1', 'detail', 0, {})])
+
+    queue.nack(queue.lease(RUN, 'w1'), 'w1', RuntimeError('first'))
+    assert queue.counts(RUN) == {'pending': 1}
+
+    task = queue.lease(RUN, 'w1')
+    assert task['attempt'] == 2
+    queue.nack(task, 'w1', RuntimeError('second'))
+    assert queue.counts(RUN) == {'failed': 1}
+    assert queue.lease(RUN, 'w1') is None
+
+def test_expired_lease_goes_to_another_worker(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=0.05)
+    try:
+        queue.put(RUN, [('p1', 'detail', 0, {})])
+        stale = queue.lease(RUN, 'crashed')
+        assert queue.lease(RUN, 'w2') is None
+
+        time.sleep(0.1)
+        task = queue.lease(RUN, 'w2')
+        assert (task['key'], task['attempt']) == ('p1', 2)
+
+        # The worker that lost the lease can no longer finish or give back the task
+        assert not queue.ack(RUN, stale, 'crashed', {})
+        queue.nack(stale, 'crashed', RuntimeError('late'))
+        assert queue.ack(RUN, task, 'w2', {'ok': True})
+        assert queue.counts(RUN) == {'done': 1}
+    finally:
+        queue.close()
+
+def test_tasks_survive_reopening_the_file(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.put(RUN, [('p1', 'detail', 0, {'category': 'totes'})])
+    queue.lease(RUN, 'w1')
+    queue.close()
+
+    reopened = WorkQueue(queue_path)
+    try:
+        assert reopened.latest_run() == RUN
+        assert reopened.tasks(RUN) == [('p1', 'detail', 'leased', {'category': 'totes'}, None)]
+        assert reopened.lease(RUN, 'w2') is None
+    finally:
+        reopened.close()
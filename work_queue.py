@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import time
+
+class WorkQueue:
+    """Durable task queue in a SQLite file, shared by any number of worker processes.
+
+    Tasks belong to a run and are unique per (run, key), so enqueueing the
+    same work twice is harmless. A worker leases a task for lease_seconds;
+    if it dies without acknowledging, the lease expires and another worker
+    picks the task up. Failed attempts go back to the queue until
+    max_attempts is reached. Acknowledging stores the task's result and can
+    enqueue follow-up tasks in the same transaction.
+    """
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run TEXT NOT NULL,
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                UNIQUE (run, key)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_ready ON tasks (run, state, priority, id)')
+
+    def _put(self, run, tasks):
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO tasks (run, key, kind, priority, payload) VALUES (?, ?, ?, ?, ?)',
+            [(run, key, kind, priority, json.dumps(payload, ensure_ascii=False))
+             for key, kind, priority, payload in tasks]
+        )
+
+    def put(self, run, tasks):
+        """Enqueue (key, kind, priority, payload) tuples; keys already in the run are skipped"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._put(run, tasks)
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def lease(self, run, owner):
+        """Lease the next ready task of run for owner; return it as a dict, or None"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute('''
+                SELECT id, key, kind, payload, attempts FROM tasks
+                WHERE run = ? AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+                ORDER BY priority DESC, id
+                LIMIT 1
+            ''', (run, now)).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            task_id, key, kind, payload, attempts = row
+            self.conn.execute('''
+                UPDATE tasks SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?
+            ''', (owner, now + self.lease_seconds, task_id))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return {'id': task_id, 'key': key, 'kind': kind, 'payload': json.loads(payload), 'attempt': attempts + 1}
+
+    def ack(self, run, task, owner, result, follow_up=()):
+        """Mark a leased task done with its result and enqueue follow_up tasks atomically.
+
+        Returns False if the lease was lost to another worker in the meantime,
+        in which case nothing is written.
+        """
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = self.conn.execute('''
+                UPDATE tasks SET state = 'done', result = ?, error = NULL, lease_owner = NULL, lease_expires = NULL
+                WHERE id = ? AND state = 'leased' AND lease_owner = ?
+            ''', (json.dumps(result, ensure_ascii=False), task['id'], owner))
+            if cursor.rowcount:
+                self._put(run, follow_up)
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return bool(cursor.rowcount)
+
+    def nack(self, task, owner, error):
+        """Give a leased task back after a failure; it fails for good after max_attempts"""
+        state = 'failed' if task['attempt'] >= self.max_attempts else 'pending'
+        self.conn.execute('''
+            UPDATE tasks SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND state = 'leased' AND lease_owner = ?
+        ''', (state, str(error), task['id'], owner))
+
+    def counts(self, run):
+        """Return a dict of state -> number of tasks in run"""
+        return dict(self.conn.execute(
+            'SELECT state, COUNT(*) FROM tasks WHERE run = ? GROUP BY state', (run,)
+        ).fetchall())
+
+    def tasks(self, run, kind=None):
+        """Return (key, kind, state, payload, result) of every task of run, optionally of one kind"""
+        query = 'SELECT key, kind, state, payload, result FROM tasks WHERE run = ?'
+        params = [run]
+        if kind:
+            query += ' AND kind = ?'
+            params.append(kind)
+        return [
+            (key, kind, state, json.loads(payload), json.loads(result) if result else None)
+            for key, kind, state, payload, result in self.conn.execute(query + ' ORDER BY id', params)
+        ]
+
+    def latest_run(self):
+        """Return the most recently started run in the queue, or None"""
+        row = self.conn.execute('SELECT run FROM tasks ORDER BY id DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()